@@ -0,0 +1,13 @@
+__author__ = 'cole'
+
+import time
+
+
+def best_time(fn, repeat):
+    # the fastest of repeat timings of fn(), in seconds
+    times = []
+    for _ in xrange(repeat):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return min(times)
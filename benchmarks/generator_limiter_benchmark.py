@@ -0,0 +1,65 @@
+__author__ = 'cole'
+
+'''
+generator_limiter_benchmark measures the time per item of
+number_generators.generator_limiter, stage by stage, against its pipeline
+mode, which composes the same stages as a chain of itertools iterators.
+
+    python -m benchmarks.generator_limiter_benchmark [number_of_items]
+
+times are absolute nanoseconds per item consumed from the source, which is
+itertools.count(); the first row is the cost of draining the source alone
+'''
+
+import itertools
+import sys
+
+from benchmarks import best_time
+from snippets.number_generators import generator_limiter
+
+
+ITEMS = 1000000
+
+
+def stages(items):
+    # (name, generator_limiter keyword arguments) for each combination of stages benchmarked
+    return [
+        ('count', dict(count=items)),
+        ('limit', dict(limit=items)),
+        ('callable limit', dict(limit=lambda x: x < items)),
+        ('filter_by + limit', dict(filter_by=lambda x: x & 1, limit=items)),
+        ('as_tuple=3 + count', dict(as_tuple=3, count=items // 3)),
+        ('last_only + count', dict(last_only=True, count=items)),
+    ]
+
+
+def drain(iterator):
+    for _ in iterator:
+        pass
+
+
+def per_item(seconds, items):
+    return seconds / items * 1e9
+
+
+def run(items=ITEMS, repeat=3):
+    source = best_time(lambda: drain(itertools.islice(itertools.count(), items)), repeat)
+    yield 'itertools.count (source only)', per_item(source, items), per_item(source, items)
+
+    for name, kwargs in stages(items):
+        limiter = best_time(lambda: drain(generator_limiter(**kwargs)), repeat)
+        pipeline = best_time(lambda: drain(generator_limiter(pipeline=True, **kwargs)), repeat)
+        yield name, per_item(limiter, items), per_item(pipeline, items)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    items = int(argv[0]) if argv else ITEMS
+
+    print '{:>32} {:>17} {:>17} {:>8}'.format('stages', 'limiter ns/item', 'pipeline ns/item', 'speedup')
+    for name, limiter, pipeline in run(items):
+        print '{:>32} {:>17.1f} {:>17.1f} {:>7.1f}x'.format(name, limiter, pipeline, limiter / pipeline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+__author__ = 'cole'
+
+'''
+year_qtr_benchmark compares the memory and throughput of the interned,
+__slots__ based year_quarter.YearQtr against the original __dict__ based class,
+kept here as LegacyYearQtr.
+
+    python -m benchmarks.year_qtr_benchmark [number_of_codes]
+'''
+
+import random
+import sys
+import timeit
+import warnings
+
+from year_quarter import YearQtr, incr_yq
+
+
+class LegacyYearQtr(object):
+    # year_quarter.YearQtr as it was before ordinal storage and interning
+
+    def __init__(self, quarter_code):
+        quarter_code = isinstance(quarter_code, long) and int(quarter_code) or quarter_code
+        assert isinstance(quarter_code, int), \
+            "YearQtr number must be an integer"
+        assert quarter_code > 0, "YearQtr number must be greater than 0"
+
+        self.yq = quarter_code
+        self.year = self.yq // 10
+        self.qtr = self.yq % 10
+
+        if self.year < 2000:
+            warnings.warn("Using a year earlier than 2000")
+
+        self.yq = incr_yq(self.yq, 0)
+
+
+def instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def quarter_codes(n, first_year=2000, years=20):
+    return [random.randint(first_year, first_year + years - 1) * 10 + random.randint(1, 4) for _ in xrange(n)]
+
+
+def keyed_dict_size(cls, codes):
+    # bytes held by a dict keyed on one instance per code, counting each distinct instance once
+    dct = dict((cls(code), code) for code in codes)
+    instances = dict((id(k), k) for k in dct)
+    return sys.getsizeof(dct) + sum(instance_size(k) for k in instances.itervalues()), len(dct)
+
+
+def construction_rate(cls, codes, repeat=3):
+    seconds = min(timeit.repeat(lambda: [cls(code) for code in codes], number=1, repeat=repeat))
+    return len(codes) / seconds
+
+
+def lookup_rate(cls, codes, repeat=3):
+    keys = [cls(code) for code in codes]
+    dct = dict((k, None) for k in keys)
+    seconds = min(timeit.repeat(lambda: [k in dct for k in keys], number=1, repeat=repeat))
+    return len(keys) / seconds
+
+
+def run(n=200000):
+    codes = quarter_codes(n)
+    results = []
+    for cls in (LegacyYearQtr, YearQtr):
+        dict_bytes, dict_keys = keyed_dict_size(cls, codes)
+        results.append({
+            'class': cls.__name__,
+            'instance_bytes': instance_size(cls(codes[0])),
+            'dict_bytes': dict_bytes,
+            'dict_keys': dict_keys,
+            'constructed_per_second': construction_rate(cls, codes),
+            'lookups_per_second': lookup_rate(cls, codes),
+        })
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print '%d quarter codes' % n
+    for result in run(n):
+        print '{class:>14}: {instance_bytes:>4} bytes/instance, {dict_keys:>7} dict keys in {dict_bytes:>10} bytes, ' \
+              '{constructed_per_second:>12,.0f} constructed/s, {lookups_per_second:>12,.0f} lookups/s'.format(**result)
@@ -0,0 +1,192 @@
+__author__ = 'cole'
+
+'''
+year_quarter_benchmark measures calls per second and allocations for the
+year_quarter hot paths: incr_yq, dif_yq, count_yq, YearQtr.quarter_codes
+and TimeFrameMixin.time_frame_dict, over 1, 1k and 1M quarter codes and
+time frames of 4, 20 and 200 quarters.
+
+Results are written as json so runs can be compared between commits:
+
+    python -m benchmarks.year_quarter_benchmark --output before.json
+    git checkout <other commit>
+    python -m benchmarks.year_quarter_benchmark --output after.json --compare before.json
+
+allocations are counted with tracemalloc where it is available, and otherwise
+as the net number of new gc-tracked objects (lists, generators, instances, ...)
+'''
+
+import argparse
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+
+from benchmarks import best_time
+import year_quarter as yq
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+CODE_SIZES = (1, 1000, 1000000)
+FRAME_SIZES = (4, 20, 200)
+MIN_WORK = 100000  # codes or quarters processed per timing, so small sizes are looped
+REGRESSION_TOLERANCE = 0.20
+
+
+class TimeFrame(yq.TimeFrameMixin):
+    pass
+
+
+def quarter_codes(n, first_year=2000, years=20):
+    rnd = random.Random(n)
+    return [rnd.randint(first_year, first_year + years - 1) * 10 + rnd.randint(1, 4) for _ in xrange(n)]
+
+
+def count_allocations(fn):
+    # allocations made by one call to fn and still alive in its result, which is held while they are
+    # counted: tracemalloc blocks, or without tracemalloc (python 2) gc-tracked objects, which leaves out
+    # untracked ones such as ints, floats and strings
+    if tracemalloc is not None:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        result = fn()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        return sum(max(stat.count_diff, 0) for stat in after.compare_to(before, 'filename'))
+
+    gc.collect()
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        result = fn()
+        return len(gc.get_objects()) - before
+    finally:
+        gc.enable()
+
+
+def measure(name, size, calls, fn, work=None, repeat=5):
+    # fn makes `calls` calls, processing `work` codes or quarters in all (calls by default)
+    loops = max(1, MIN_WORK // (work or calls))
+    seconds = best_time(lambda: [fn() for _ in xrange(loops)], repeat) / loops
+    return {
+        'name': name,
+        'size': size,
+        'calls': calls,
+        'seconds': seconds,
+        'calls_per_second': calls / seconds if seconds else float('inf'),
+        'allocations_per_call': float(count_allocations(fn)) / calls,
+    }
+
+
+def code_benchmarks(sizes):
+    for size in sizes:
+        codes = quarter_codes(size)
+        others = quarter_codes(size + 1)[1:]
+
+        yield measure('incr_yq', size, size, lambda: [yq.incr_yq(code, 5) for code in codes])
+        yield measure('dif_yq', size, size, lambda: [yq.dif_yq(a, b) for a, b in zip(codes, others)])
+        yield measure('YearQtr', size, size, lambda: [yq.YearQtr(code) for code in codes])
+        # calls for YearQtrArray are codes processed, for comparison with the scalar functions
+        yield measure('YearQtrArray.incr', size, size, lambda: yq.YearQtrArray(codes).incr(5))
+        yield measure('YearQtrArray.dif', size, size, lambda: yq.YearQtrArray(codes).dif(yq.YearQtrArray(others)))
+
+
+def frame_benchmarks(sizes, calls=1000):
+    for size in sizes:
+        work = calls * size
+        start = 20001
+        end = yq.incr_yq(start, size - 1)
+        year_qtr = yq.YearQtr(start)
+
+        yield measure('count_yq', size, calls, lambda: [list(yq.count_yq(start, size)) for _ in xrange(calls)], work)
+        yield measure('count_yq.len_in', size, calls,
+                      lambda: [(len(yq.count_yq(start, size)), end in yq.count_yq(start, size)) for _ in xrange(calls)],
+                      work)
+        yield measure('YearQtr.quarter_codes', size, calls,
+                      lambda: [list(year_qtr.quarter_codes(end)) for _ in xrange(calls)], work)
+
+        tf = TimeFrame()
+        tf.set_time_frame(start, end)
+        yield measure('time_frame_dict', size, calls,
+                      lambda: [tf.look_back_or_last('four_quarter_lookback') for _ in xrange(calls)], work)
+
+        currents = [end, yq.incr_yq(end, -1)]
+
+        def rebuild():
+            for i in xrange(calls):
+                tf.set_current_quarter_code(currents[i & 1])
+                tf.look_back_or_last('four_quarter_lookback')
+
+        yield measure('time_frame_dict.rebuild', size, calls, rebuild, work)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(code_sizes=CODE_SIZES, frame_sizes=FRAME_SIZES):
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'allocations': tracemalloc is not None and 'tracemalloc blocks' or 'net gc-tracked objects',
+        'results': list(code_benchmarks(code_sizes)) + list(frame_benchmarks(frame_sizes)),
+    }
+
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    '''
+    compare yields (name, size, speedup, regressed) for each benchmark in both runs, where
+    speedup is the ratio of calls per second and regressed is whether it is below 1 - tolerance
+    '''
+
+    baseline = dict(((r['name'], r['size']), r) for r in baseline['results'])
+    for result in results['results']:
+        base = baseline.get((result['name'], result['size']))
+        if base is not None:
+            speedup = result['calls_per_second'] / base['calls_per_second']
+            yield result['name'], result['size'], speedup, speedup < 1 - tolerance
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='year_quarter micro-benchmarks')
+    parser.add_argument('--output', help='write json results to this file')
+    parser.add_argument('--compare', help='json results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='slow-down, as a fraction, reported as a regression')
+    parser.add_argument('--quick', action='store_true', help='skip the 1M code size')
+    args = parser.parse_args(argv)
+
+    code_sizes = CODE_SIZES[:-1] if args.quick else CODE_SIZES
+    results = run(code_sizes)
+
+    for r in results['results']:
+        print '{name:>24} {size:>8}: {calls_per_second:>14,.0f} calls/s {allocations_per_call:>10.2f} allocs/call'.format(**r)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        print '\ncompared with %s' % (baseline.get('commit') or args.compare)
+        for name, size, speedup, regressed in compare(results, baseline, args.tolerance):
+            regressions += regressed
+            print '{:>24} {:>8}: {:>6.2f}x{}'.format(name, size, speedup, regressed and '  REGRESSION' or '')
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+__author__ = 'cole'
+
+'''
+expression parses lambda strings, e.g. "(lambda salary, target: min(salary * 0.1, target))",
+into a restricted syntax tree and compiles them without eval() of the raw string.
+
+Only these are allowed in the body of the lambda:
+    numbers, strings, True, False, None and the lambda's own arguments
+    arithmetic: + - * / // % **, unary + - and not
+    comparisons: == != < <= > >=, chained or not, combined with and / or
+    conditionals: x if condition else y
+    calls of min, max, sum and abs, and lists or tuples as their arguments
+
+anything else (attribute access, subscripts, other names or calls, comprehensions, ...)
+raises ExpressionError when the expression is parsed, so a stored string can never
+reach the rest of python
+
+An Expression is compiled twice over the same tree: to a plain python function for
+single values, and, on first use, to a numpy function over columns of values, where
+conditionals become np.where and min / max become elementwise np.minimum / np.maximum
+'''
+
+import ast
+from functools import partial
+
+import numpy as np  # pip install numpy
+
+
+FUNCTIONS = ('min', 'max', 'sum', 'abs')
+CONSTANTS = {'True': True, 'False': False, 'None': None}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.Lambda, ast.arguments, ast.Name, ast.Load, ast.Param, ast.Num, ast.Str,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UnaryOp, ast.UAdd, ast.USub, ast.Not, ast.BoolOp, ast.And, ast.Or,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.IfExp, ast.Call, ast.List, ast.Tuple,
+)
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _reduce_elementwise(function, *values):
+    # min(a, b, c) or min([a, b, c]) over columns, elementwise
+    values = values[0] if len(values) == 1 else values
+    return reduce(function, values)
+
+
+_SCALAR_NAMESPACE = dict(CONSTANTS, __builtins__={}, min=min, max=max, sum=sum, abs=abs)
+_VECTOR_NAMESPACE = dict(
+    CONSTANTS, __builtins__={}, min=partial(_reduce_elementwise, np.minimum), max=partial(_reduce_elementwise, np.maximum),
+    sum=sum, abs=np.abs, _where=np.where, _and=partial(reduce, np.logical_and), _or=partial(reduce, np.logical_or),
+    _not=np.logical_not,
+)
+
+
+def _parse(source):
+    # the validated ast.Expression of a lambda string
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ExpressionError('invalid syntax in %r: %s' % (source, e.msg))
+
+    if not isinstance(tree.body, ast.Lambda):
+        raise ExpressionError('%r is not a lambda' % source)
+
+    arguments = tree.body.args
+    if arguments.kwarg or arguments.defaults:
+        raise ExpressionError('lambda arguments may not have defaults or **kwargs')
+
+    names = set(a.id for a in arguments.args if isinstance(a, ast.Name)) | set([arguments.vararg]) - set([None])
+    if len(names) != len(arguments.args) + bool(arguments.vararg):
+        raise ExpressionError('lambda arguments must be plain names')
+
+    for node in ast.walk(tree.body.body):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ExpressionError('%s is not allowed in an expression' % type(node).__name__)
+
+        if isinstance(node, ast.Name) and node.id not in names and node.id not in CONSTANTS and \
+                node.id not in FUNCTIONS:
+            raise ExpressionError('unknown name %r' % node.id)
+
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.func.id in names:
+                raise ExpressionError('only %s may be called' % ', '.join(FUNCTIONS))
+            if node.keywords or node.starargs or node.kwargs:
+                raise ExpressionError('calls take positional arguments only')
+
+        if isinstance(node, ast.Lambda):
+            raise ExpressionError('nested lambdas are not allowed')
+
+    return tree
+
+
+class _Vectorize(ast.NodeTransformer):
+    # rewrites the python-only parts of an expression into calls of the numpy helpers
+
+    @staticmethod
+    def _call(name, args, node):
+        return ast.copy_location(ast.Call(ast.Name(name, ast.Load()), args, [], None, None), node)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self._call('_where', [node.test, node.body, node.orelse], node)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        return self._call(isinstance(node.op, ast.And) and '_and' or '_or', [ast.List(node.values, ast.Load())], node)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        return self._call('_not', [node.operand], node) if isinstance(node.op, ast.Not) else node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+
+        # a < b < c is a < b and b < c, elementwise
+        operands = [node.left] + node.comparators
+        pairs = [ast.Compare(left, [op], [right]) for left, op, right in zip(operands, node.ops, operands[1:])]
+        return self._call('_and', [ast.List(pairs, ast.Load())], node)
+
+
+class Expression(object):
+    '''
+    Expression(source) parses and validates a lambda string once, raising ExpressionError
+    if it steps outside the restricted syntax, and compiles it to a callable:
+
+        expression = Expression("(lambda x, y: x * 2 if y else x)")
+        expression(21, True) == 42
+
+    evaluate_columns(*columns) evaluates the same expression once over whole columns,
+    sequences or numpy arrays of equal length (or scalars, which are broadcast), and
+    returns a numpy array of the results:
+
+        expression.evaluate_columns([1, 2, 3], [True, False, True]) == array([2, 2, 6])
+    '''
+
+    __slots__ = ('source', 'arguments', '_tree', '_function', '_vectorized')
+
+    def __init__(self, source):
+        self.source = source
+        self._tree = _parse(source)
+
+        arguments = self._tree.body.args
+        self.arguments = tuple(a.id for a in arguments.args) + (('*' + arguments.vararg,) if arguments.vararg else ())
+
+        self._function = eval(compile(self._tree, '<expression>', 'eval'), dict(_SCALAR_NAMESPACE))
+        self._vectorized = None
+
+    def __call__(self, *args):
+        return self._function(*args)
+
+    def __repr__(self):
+        return 'Expression(%r)' % self.source
+
+    @property
+    def vectorized(self):
+        if self._vectorized is None:
+            tree = ast.fix_missing_locations(_Vectorize().visit(_parse(self.source)))
+            self._vectorized = eval(compile(tree, '<expression>', 'eval'), dict(_VECTOR_NAMESPACE))
+        return self._vectorized
+
+    def evaluate_columns(self, *columns):
+        columns = [np.asarray(column) for column in columns]
+        result = np.asarray(self.vectorized(*columns))
+
+        shape = np.broadcast(*columns).shape if columns else ()
+        if result.shape != shape:
+            result = np.array(np.broadcast_to(result, shape))
+        return result
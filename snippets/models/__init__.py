@@ -1,3 +1,3 @@
 __author__ = 'cole'
 
-from lambda_model import LambdaCode
\ No newline at end of file
+from lambda_model import LambdaCode, LambdaGraph, bulk_update, evaluate_many, score_many
\ No newline at end of file
@@ -1,30 +1,135 @@
 __author__ = 'cole'
 
-from django.db import models
+from collections import OrderedDict, defaultdict
+from multiprocessing.pool import ThreadPool
+from operator import attrgetter, or_
+import threading
+import weakref
+
+import numpy as np  # pip install numpy
+
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.signals import post_save
 from django.db.models.loading import get_model
+from django.db.models.sql.constants import QUERY_TERMS
 
 from picklefield import PickledObjectField  # pip install django-picklefield
 
+from snippets.expression import Expression, ExpressionError
+
+
+def complete_lambda_string(lambda_string, string_args=None):
+    if string_args:
+        return lambda_string.format(*string_args)
+    else:
+        return lambda_string
+
+
+def calculator_key(lambda_string, string_args=None):
+    # the (lambda_string, string_args) key of a calculator; string_args may be a list, so it is keyed by repr
+    return lambda_string, repr(tuple(string_args or ()))
+
+
+class LRUCache(object):
+    '''
+    LRUCache(maxsize) is a thread-safe mapping which evicts the least recently used
+    value once maxsize are held; get(key, compute) returns the value for key, calling
+    compute() to fill it on a miss. hits and misses count lookups, to check it is working
+    '''
+
+    _missing = object()
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            value = self._values.pop(key, self._missing)
+            if value is not self._missing:
+                self.hits += 1
+                self._values[key] = value
+                return value
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self._values[key] = value
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self), 'maxsize': self.maxsize}
+
+
+class CalculatorCache(LRUCache):
+    '''
+    CalculatorCache(maxsize) is a process-wide cache of compiled LambdaCode calculators:
+    the snippets.expression.Expression compiled from each complete lambda string, keyed by
+    calculator_key(lambda_string, string_args), so a lambda string is formatted, parsed
+    and validated once rather than on every evaluation
+    '''
+
+    def calculator(self, lambda_string, string_args=None):
+        return self.get(calculator_key(lambda_string, string_args),
+                        lambda: Expression(complete_lambda_string(lambda_string, string_args)))
+
+
+def input_fingerprint(inputs):
+    # a hashable fingerprint of resolved input values: the values with their types, as 1, 1.0 and True
+    # are equal but divide differently, or their repr if unhashable
+    inputs = tuple((type(value), value) for value in inputs)
+    try:
+        hash(inputs)
+        return inputs
+    except TypeError:
+        return repr(inputs)
+
+
+calculator_cache = CalculatorCache()
+value_cache = LRUCache(maxsize=1 << 16)  # LambdaCode values, keyed by (calculator_key, input_fingerprint)
+
 
 class LambdaCode(models.Model):
     '''
     LambdaCode is a model for a lambda and its associated variables.
 
     lambda_string is the one required field and is used as follows:
-            _calculator = eval(lambda_string)
+            _calculator = Expression(lambda_string)
+
+      the lambda is parsed by snippets.expression rather than eval()ed, so its body
+      is restricted to arithmetic, comparisons, conditionals and min/max/sum/abs
+      of its arguments; save() rejects any other lambda string
 
       If an assignable lambda is written in the form
       (lambda *args: value_from_calculation), e.g. l = (lambda _: True),
       m = l, l(5) == m(False) == True, where 'l' is the name and
       '(lambda _: True)' is the expression, then
       lambda_string is the expression in QUOTATION MARKS, e.g.
-      "(lambda _: True)", which makes a lambda_string 'eval()-able'
+      "(lambda _: True)"
 
     string_args is a list of inputs for lambda_string.format()
     each arg will correspond to a '{}' in the lambda_string, which allows
 
             lambda_string = lambda_string.format(*string_args)
-            _calculator = eval(lambda_string)
+            _calculator = Expression(lambda_string)
 
       e.g. lambda_string = "(lambda _: {})", string_args = (3,)
       lambda_string.format(*string_args) = "(lambda _: 3)"
@@ -36,7 +141,7 @@ class LambdaCode(models.Model):
             lambda_variables = ['foo'],
             getattr(model, 'foo') = 24,
             _inputs = [getattr(model, v) for v in lambda_variables]
-            _calculator = eval(lambda_string)
+            _calculator = Expression(lambda_string)
             _calculator(*_inputs) = 42
 
     app_model_name is a string in the form "app.model"
@@ -54,6 +159,9 @@ class LambdaCode(models.Model):
     Alternatively, by providing 'model_app_string' and
     'model_get_key_value' a LambdaCode object can
     create the lambda, get its needed inputs and return its value
+
+    lambda strings are compiled once per process, in calculator_cache; the compiled
+    calculator of a row whose lambda_string or string_args change is dropped on save
     '''
 
     name = models.CharField(max_length=80, unique=True)
@@ -67,15 +175,28 @@ class LambdaCode(models.Model):
     class Meta:
         abstract = True
 
+    def __init__(self, *args, **kwargs):
+        super(LambdaCode, self).__init__(*args, **kwargs)
+        self._saved_calculator_key = self.calculator_key
+
     @property
     def _complete_lambda_string(self):
-        if self.string_args:
-            return self.lambda_string.format(*self.string_args)
-        else:
-            return self.lambda_string
+        return complete_lambda_string(self.lambda_string, self.string_args)
+
+    @property
+    def calculator_key(self):
+        return calculator_key(self.lambda_string, self.string_args)
 
     def get_lambda(self):
-        return eval(self._complete_lambda_string)
+        return calculator_cache.calculator(self.lambda_string, self.string_args)
+
+    def evaluate_columns(self, *columns):
+        '''
+        evaluate_columns(*columns) evaluates the lambda once over whole columns of
+        inputs, one numpy array (or sequence) per lambda variable, see Expression
+        '''
+
+        return self.get_lambda().evaluate_columns(*columns)
 
     @property
     def _lambda(self):
@@ -88,29 +209,26 @@ class LambdaCode(models.Model):
     def app_model(self):
         return get_model(*self.app_model_name.split('.', 1))
 
+    @property
+    def lookup_plan(self):
+        variables = self.lambda_variables if isinstance(self.lambda_variables, (list, tuple)) else ()
+        return get_lookup_plan(self.app_model, variables)
+
     @property
     def model_instance(self):
         if not hasattr(self, '_model_instance'):
-            self._model_instance = self.app_model.objects.get(**self.model_get_key_value)
+            # fetched with every related object the lambda_variables reach, see LookupPlan
+            self._model_instance = self.lookup_plan.queryset().get(**self.model_get_key_value)
         return self._model_instance
 
     def _attribute_lookup(self, components, lookup_object=None):
         '''
         _attribute_lookup takes a list of related keywords (i.e. attributes of attributes),
-        and constructs the object which has the final component keyword.
-        e.g. ['user', 'name'] constructs the object self.user
-        and then returns the value of self.user.name
-
-        recursion is used to handle a component list of length n.
+        and returns the value of the final component keyword,
+        e.g. ['user', 'name'] returns the value of self.user.name
         '''
 
-        component = components.pop(0)
-        lookup_value = getattr(lookup_object or self.model_instance, component)
-
-        if components:
-            lookup_value = self._attribute_lookup(components, lookup_value)
-
-        return lookup_value
+        return attrgetter('.'.join(components))(lookup_object or self.model_instance)
 
     def set_variables(self, variables):
         self._variables_list = variables
@@ -125,10 +243,10 @@ class LambdaCode(models.Model):
 
         variables = variables or self.lambda_variables
 
-        variable_list = []
         if isinstance(variables, list) or isinstance(variables, tuple):
-            for v in variables:
-                variable_list.append(self._attribute_lookup(v.split('.')))
+            plan = get_lookup_plan(type(self.model_instance), variables)
+            variable_list = plan.values(self.model_instance)
+            _watch_inputs(self, plan.models)
 
         else:
             variable_list = [variables, ]
@@ -136,10 +254,27 @@ class LambdaCode(models.Model):
         self._variables_list = variable_list
         return self._variables_list
 
+    def _forget_inputs(self, saved):
+        '''
+        _forget_inputs(saved) drops the resolved variables after the saved instance, one of
+        the model instances they were read from, is saved, so they are resolved again on next use
+        '''
+
+        self.__dict__.pop('_variables_list', None)
+
+        instance = self.__dict__.get('_model_instance')
+        if instance is None or instance is saved:
+            return
+
+        if type(instance) is type(saved) and instance.pk == saved.pk:
+            self._model_instance = saved
+        elif self.model_get_key_value:
+            del self._model_instance  # its related objects may be stale, so it is fetched again
+
     def _calculate(self):
 
         ### WORKFLOW ###################################################
-        # 1. create a _calculator by evaling the appropriate
+        # 1. create a _calculator by compiling the appropriate
         #    lambda code string, which defines the actual calculation
         # 2. get the list of input values from a list of variables
         #
@@ -156,7 +291,15 @@ class LambdaCode(models.Model):
 
     @property
     def value(self):
-        return self._calculate()
+        '''
+        value is memoized in value_cache, keyed on the calculator and a fingerprint of the
+        resolved input values, so a repeated read with unchanged inputs skips the calculation;
+        inputs are resolved again once any model they were read from is saved
+        '''
+
+        _inputs = self.variables_list(self.lambda_variables)
+        return value_cache.get((self.calculator_key, input_fingerprint(_inputs)),
+                               lambda: self.get_lambda()(*_inputs))
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
@@ -166,13 +309,493 @@ class LambdaCode(models.Model):
                 'A dict is required for this model_get_key_value'
 
         try:
-            _ = eval(self.lambda_string)
+            _ = self.get_lambda()
 
-        except:
-            assert False, "lambda string is un-eval()-able"
+        except (ExpressionError, LookupError) as e:  # LookupError: string_args which do not fit the string
+            assert False, "lambda string is not a valid expression: %s" % e
 
         super(LambdaCode, self).save(force_insert=False, force_update=False, using=None,
                                      update_fields=None)
 
+        if self._saved_calculator_key != self.calculator_key:
+            calculator_cache.invalidate(self._saved_calculator_key)
+            self._saved_calculator_key = self.calculator_key
+
     def __unicode__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+QUERY_BATCH_SIZE = 500  # model_get_key_value lookups per query, below sqlite's limit on query variables
+
+
+def _relation_hops(model, variable):
+    '''
+    _relation_hops(model, 'department.head.salary') returns the related-object hops along a dotted
+    lambda variable as (lookup, single, related model) triples, e.g.
+    [('department', True, Department), ('department__head', True, Employee)]; single is False for a hop to many objects (a many-to-many or reverse foreign key accessor),
+    after which there is nothing more to fetch ahead. Attributes which are not relations end the hops
+    '''
+
+    hops, path = [], []
+    for component in variable.split('.')[:-1]:
+        try:
+            field, _, direct, m2m = model._meta.get_field_by_name(component)
+            related, single = (field.rel.to, not m2m) if direct and field.rel else (None, False)
+        except FieldDoesNotExist:
+            reverse = [r for r in model._meta.get_all_related_objects() +
+                       model._meta.get_all_related_many_to_many_objects() if r.get_accessor_name() == component]
+            related, single = (reverse[0].model, False) if reverse else (None, False)
+
+        if related is None:
+            break
+
+        path.append(component)
+        hops.append(('__'.join(path), single, related))
+        if not single:
+            break
+        model = related
+
+    return hops
+
+
+class LookupPlan(object):
+    '''
+    LookupPlan(model, variables) compiles the dotted lambda variables of a model once:
+    an operator.attrgetter per variable, the select_related lookups for the foreign key
+    and one-to-one hops along them, and the prefetch_related lookups for hops to many objects.
+
+    an instance fetched with plan.queryset() has every related object the variables reach,
+    so plan.values(instance) costs no further queries, rather than a lazy query per hop:
+
+        plan = get_lookup_plan(Employee, ['salary', 'department.budget', 'department.head.salary'])
+        plan.select_related == ('department', 'department__head')
+        plan.values(plan.queryset().get(id=1)) == [salary, budget, head salary]
+
+    plan.models is the model and every related model the variables pass through
+    '''
+
+    __slots__ = ('model', 'variables', 'select_related', 'prefetch_related', 'models', '_getters')
+
+    def __init__(self, model, variables):
+        self.model = model
+        self.variables = tuple(variables)
+        self.models = set([model])
+
+        select_related, prefetch_related = set(), set()
+        for variable in self.variables:
+            for lookup, single, related in _relation_hops(model, variable):
+                (select_related if single else prefetch_related).add(lookup)
+                self.models.add(related)
+
+        self.select_related = tuple(sorted(select_related))
+        self.prefetch_related = tuple(sorted(prefetch_related))
+        self._getters = [attrgetter(variable) for variable in self.variables]
+
+    def queryset(self, queryset=None):
+        # queryset, model.objects.all() by default, fetching the related objects of the variables
+        queryset = self.model.objects.all() if queryset is None else queryset
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+    def values(self, instance):
+        return [get(instance) for get in self._getters]
+
+
+lookup_plans = LRUCache(maxsize=1024)  # LookupPlans, keyed by (model, variables)
+
+
+def get_lookup_plan(model, variables):
+    variables = tuple(variables)
+    return lookup_plans.get((model, variables), lambda: LookupPlan(model, variables))
+
+
+def _fetch_instances(model, lambda_codes):
+    # sets the model instance of each LambdaCode from batched queries of model, where it can be matched
+    # the instances are matched by their model_get_key_value paths, so those relations are fetched too
+    variables = set()
+    for lambda_code in lambda_codes:
+        if isinstance(lambda_code.lambda_variables, (list, tuple)):
+            variables.update(lambda_code.lambda_variables)
+        variables.update(k.replace('__', '.') for k in lambda_code.model_get_key_value)
+    plan = get_lookup_plan(model, sorted(variables))
+
+    by_keys = defaultdict(list)
+    for lambda_code in lambda_codes:
+        by_keys[tuple(sorted(lambda_code.model_get_key_value))].append(lambda_code)
+
+    for keys, group in by_keys.items():
+        if any(k.rsplit('__', 1)[-1] in QUERY_TERMS for k in keys):
+            continue  # e.g. name__iexact: not a value an instance can be matched by
+
+        key_values = attrgetter(*[k.replace('__', '.') for k in keys])
+        key_values = key_values if len(keys) > 1 else (lambda instance, get=key_values: (get(instance),))
+
+        queryset = plan.queryset()
+        for i in xrange(0, len(group), QUERY_BATCH_SIZE):
+            batch = group[i:i + QUERY_BATCH_SIZE]
+            if len(keys) == 1:
+                lookups = Q(**{keys[0] + '__in': [lc.model_get_key_value[keys[0]] for lc in batch]})
+            else:
+                lookups = reduce(or_, [Q(**lc.model_get_key_value) for lc in batch])
+
+            instances = dict((key_values(instance), instance) for instance in queryset.filter(lookups))
+            for lambda_code in batch:
+                instance = instances.get(tuple(lambda_code.model_get_key_value[k] for k in keys))
+                if instance is not None:
+                    lambda_code.set_instance(instance)
+
+
+def evaluate_many(lambda_codes):
+    '''
+    evaluate_many(lambda_codes) returns the value of each LambdaCode, in order.
+
+    rather than one objects.get() per LambdaCode and a query per related object,
+    LambdaCodes are grouped by app_model_name and the instances of each model are
+    fetched together, in one filter() query per QUERY_BATCH_SIZE LambdaCodes, with the
+    select_related and prefetch_related lookups reached by their lambda_variables
+
+    a LambdaCode which already has an instance keeps it, and one whose instance
+    can not be matched to the batch falls back to its own objects.get()
+    '''
+
+    lambda_codes = list(lambda_codes)
+    _fetch_model_instances(lambda_codes)
+    return [lambda_code.value for lambda_code in lambda_codes]
+
+
+def _fetch_model_instances(lambda_codes):
+    # fetches the model instances of the LambdaCodes without one, a model at a time, see _fetch_instances
+    groups = defaultdict(list)
+    for lambda_code in lambda_codes:
+        if lambda_code.app_model_name and lambda_code.model_get_key_value and \
+                not hasattr(lambda_code, '_model_instance'):
+            groups[lambda_code.app_model_name].append(lambda_code)
+
+    for group in groups.values():
+        _fetch_instances(group[0].app_model, group)
+
+
+def bulk_update(model, instances, fields, batch_size=QUERY_BATCH_SIZE):
+    '''
+    bulk_update(model, instances, fields) saves the given fields of many instances in one
+    UPDATE per batch: the manager's own bulk_update where django provides one (2.2 and later),
+    and otherwise UPDATE .. SET field = CASE pk WHEN .. THEN .. END WHERE pk IN (..)
+    '''
+
+    manager = model._default_manager
+    if hasattr(manager, 'bulk_update'):
+        return manager.bulk_update(instances, fields, batch_size=batch_size)
+
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    pk = model._meta.pk
+    fields = [model._meta.get_field(name) for name in fields]
+    batch_size = max(1, min(batch_size, 900 // (2 * len(fields) + 1)))  # below sqlite's 999 query variables
+
+    with transaction.atomic(using=connection.alias):
+        cursor = connection.cursor()
+        for i in xrange(0, len(instances), batch_size):
+            batch = instances[i:i + batch_size]
+            pks = [pk.get_db_prep_value(instance.pk, connection) for instance in batch]
+
+            assignments, params = [], []
+            for field in fields:
+                assignments.append('%s = CASE %s %s END' % (quote(field.column), quote(pk.column),
+                                                            ' '.join(['WHEN %s THEN %s'] * len(batch))))
+                for instance_pk, instance in zip(pks, batch):
+                    params.extend((instance_pk, field.get_db_prep_save(getattr(instance, field.attname), connection)))
+
+            cursor.execute('UPDATE %s SET %s WHERE %s IN (%s)' % (
+                quote(model._meta.db_table), ', '.join(assignments), quote(pk.column), ', '.join(['%s'] * len(batch))
+            ), params + pks)
+
+
+def _variable_column(lambda_codes, variable):
+    # the values of one lambda variable across LambdaCodes, resolved with a compiled attrgetter
+    get = attrgetter(variable)
+    return np.array([get(lambda_code.model_instance) for lambda_code in lambda_codes])
+
+
+def score_many(lambda_codes, result_field=None):
+    '''
+    score_many(lambda_codes, result_field) returns the value of each LambdaCode, in order,
+    computed a formula at a time rather than a row at a time:
+
+        1. model instances are fetched as in evaluate_many, one query per model and batch
+        2. LambdaCodes sharing a lambda string, string_args, lambda_variables and model are
+           grouped, and each lambda variable of a group is gathered into one numpy column
+        3. each group's formula is evaluated once over its columns, see Expression.evaluate_columns
+
+    result_field='score' also sets each result on its model instance and writes them back
+    with bulk_update, one UPDATE per model and batch rather than a save() per row
+    '''
+
+    lambda_codes = list(lambda_codes)
+    evaluated = [lc for lc in lambda_codes if lc.app_model_name and isinstance(lc.lambda_variables, (list, tuple))]
+
+    _fetch_model_instances(lambda_codes)
+
+    formulas = defaultdict(list)
+    for lambda_code in evaluated:
+        formulas[lambda_code.calculator_key, tuple(lambda_code.lambda_variables), lambda_code.app_model_name].append(
+            lambda_code)
+
+    results = {}
+    for (_, variables, _), group in formulas.items():
+        columns = [_variable_column(group, variable) for variable in variables]
+        values = group[0].evaluate_columns(*columns) if columns else [group[0].value] * len(group)
+        for lambda_code, value in zip(group, np.asarray(values).tolist()):
+            results[id(lambda_code)] = value
+
+    # a LambdaCode which does not name a model and variables is evaluated on its own
+    values = [results[id(lc)] if id(lc) in results else lc.value for lc in lambda_codes]
+
+    if result_field:
+        instances = defaultdict(dict)
+        for lambda_code, value in zip(evaluated, [results[id(lc)] for lc in evaluated]):
+            setattr(lambda_code.model_instance, result_field, value)
+            instances[type(lambda_code.model_instance)][lambda_code.model_instance.pk] = lambda_code.model_instance
+        for model, by_pk in instances.items():
+            bulk_update(model, by_pk.values(), [result_field])
+
+    return values
+
+
+def _row_key(instance):
+    # identifies a database row across python objects fetched for it
+    return instance._meta.concrete_model, instance.pk if instance.pk is not None else id(instance)
+
+
+class _Upstream(object):
+    # stands in for the value of another LambdaCode among resolved inputs, until it is evaluated
+    __slots__ = ('key',)
+
+    def __init__(self, key):
+        self.key = key
+
+
+class LambdaGraph(object):
+    '''
+    LambdaGraph(lambda_codes) is the dependency graph of LambdaCodes which read the value
+    of other LambdaCodes through their lambda_variables, e.g. a plan whose app_model_name is
+    the LambdaCode model itself, with lambda_variables ['value'], or a plan reading
+    'award.plan.value' where award.plan is a LambdaCode row
+
+    LambdaCodes read that way are added to the graph even if they were not given, and a
+    cycle among them fails an assertion naming the LambdaCodes in it. evaluate() then
+    evaluates every LambdaCode in topological order and returns the values of those given:
+
+        graph = LambdaGraph(Plan.objects.all(), threads=4)
+        values = graph.evaluate()
+
+    recompute(*rows) is the incremental update after rows are saved: model instances read
+    by the lambda_variables, or LambdaCodes themselves. only the LambdaCodes which read one
+    of the rows, and everything downstream of them, are resolved and evaluated again:
+
+        employee.save()
+        graph.recompute(employee)
+        graph.value(plan)
+
+    the inputs are read from the database in the calling thread; evaluation goes a level
+    of the graph at a time, and threads=n evaluates the independent LambdaCodes of each level
+    in a ThreadPool of n threads (threads=0 uses one thread per cpu)
+    '''
+
+    def __init__(self, lambda_codes, threads=None):
+        self.threads = threads
+        self.values = {}
+        self.nodes = OrderedDict()  # LambdaCodes by row key
+        self.dependencies = {}  # the row keys of the LambdaCodes each one reads the value of
+        self.dependents = defaultdict(set)
+        self.readers = defaultdict(set)  # the LambdaCodes which read each row, by row key
+        self._rows_read = {}
+        self._inputs = {}
+
+        self._given = []
+        for lambda_code in lambda_codes:
+            key = _row_key(lambda_code)
+            self.nodes.setdefault(key, lambda_code)
+            self._given.append(key)
+
+        self._resolve(list(self.nodes))
+        self.levels()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def value(self, lambda_code):
+        return self.values[_row_key(lambda_code)]
+
+    def levels(self, keys=None):
+        '''
+        levels(keys) returns the row keys of the given LambdaCodes, all of them by default,
+        in topological levels: each LambdaCode reads only the values of those in earlier levels
+        '''
+
+        keys = set(self.nodes if keys is None else keys)
+        order = dict((key, i) for i, key in enumerate(self.nodes))
+        waiting = dict((key, len(self.dependencies[key] & keys)) for key in keys)
+
+        levels = []
+        level = [key for key in keys if not waiting[key]]
+        while level:
+            levels.append(sorted(level, key=order.get))
+            ready = []
+            for key in level:
+                for dependent in self.dependents[key] & keys:
+                    waiting[dependent] -= 1
+                    if not waiting[dependent]:
+                        ready.append(dependent)
+            level = ready
+
+        # what is left waits on a cycle; trimming what only lies downstream of one leaves the cycles
+        cycle = set(key for key in keys if waiting[key])
+        downstream = [key for key in cycle if not self.dependents[key] & cycle]
+        while downstream:
+            cycle.difference_update(downstream)
+            downstream = [key for key in cycle if not self.dependents[key] & cycle]
+
+        assert not cycle, 'LambdaCode dependency cycle among: %s' % ', '.join(
+            unicode(self.nodes[key]) for key in sorted(cycle, key=order.get))
+        return levels
+
+    def evaluate(self):
+        self._evaluate(self.nodes)
+        return [self.values[key] for key in self._given]
+
+    def recompute(self, *rows):
+        '''
+        recompute(*rows) resolves again the LambdaCodes which read the rows, and evaluates
+        them and everything downstream of them; a LambdaCode row given replaces the one in
+        the graph. returns the LambdaCodes evaluated, in evaluation order
+        '''
+
+        changed = set()
+        for row in rows:
+            key = _row_key(row)
+            if key in self.nodes:
+                self.nodes[key] = row
+                changed.add(key)
+            for reader in self.readers.get(key, ()):
+                self.nodes[reader]._forget_inputs(row)
+                changed.add(reader)
+
+        affected = set()
+        pending = list(self._resolve(changed))
+        while pending:
+            key = pending.pop()
+            if key not in affected:
+                affected.add(key)
+                pending.extend(self.dependents[key])
+
+        return [self.nodes[key] for level in self._evaluate(affected) for key in level]
+
+    def _resolve(self, keys):
+        # resolves the inputs of the LambdaCodes, and of any LambdaCodes they read which are new to
+        # the graph, a round at a time so the model instances of each round are fetched together
+        resolved = []
+        while keys:
+            _fetch_model_instances([self.nodes[key] for key in keys])
+            added = []
+            for key in keys:
+                added.extend(self._resolve_one(key))
+            resolved.extend(keys)
+            keys = added
+        return resolved
+
+    def _resolve_one(self, key):
+        # sets the inputs, dependencies and rows read of one LambdaCode; returns the keys new to the graph
+        for dependency in self.dependencies.get(key, ()):
+            self.dependents[dependency].discard(key)
+        for row in self._rows_read.get(key, ()):
+            self.readers[row].discard(key)
+
+        lambda_code = self.nodes[key]
+        variables = lambda_code.lambda_variables
+        inputs, dependencies, rows_read, added = [], set(), set(), []
+
+        if isinstance(variables, (list, tuple)) and (lambda_code.app_model_name or
+                                                     hasattr(lambda_code, '_model_instance')):
+            instance = lambda_code.model_instance
+            rows_read.add(_row_key(instance))
+
+            for variable in variables:
+                components = variable.split('.')
+                value = instance
+                for component in components[:-1]:
+                    value = getattr(value, component)
+                    if isinstance(value, models.Model):
+                        rows_read.add(_row_key(value))
+
+                if components[-1] == 'value' and isinstance(value, LambdaCode):
+                    dependency = _row_key(value)
+                    if dependency not in self.nodes:
+                        self.nodes[dependency] = value
+                        added.append(dependency)
+                    dependencies.add(dependency)
+                    value = _Upstream(dependency)
+                else:
+                    value = getattr(value, components[-1])
+                inputs.append(value)
+        else:
+            inputs = lambda_code.variables_list(variables)
+
+        self._inputs[key] = inputs
+        self.dependencies[key] = dependencies
+        self._rows_read[key] = rows_read
+        for dependency in dependencies:
+            self.dependents[dependency].add(key)
+        for row in rows_read:
+            self.readers[row].add(key)
+        return added
+
+    def _calculate(self, key):
+        lambda_code = self.nodes[key]
+        inputs = [self.values[i.key] if isinstance(i, _Upstream) else i for i in self._inputs[key]]
+        return value_cache.get((lambda_code.calculator_key, input_fingerprint(inputs)),
+                               lambda: lambda_code.get_lambda()(*inputs))
+
+    def _evaluate(self, keys):
+        levels = self.levels(keys)
+
+        pool = None
+        if self.threads is not None and any(len(level) > 1 for level in levels):
+            pool = ThreadPool(self.threads or None)
+        try:
+            for level in levels:
+                values = pool.map(self._calculate, level) if pool and len(level) > 1 else map(self._calculate, level)
+                self.values.update(zip(level, values))
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        return levels
+
+
+# the LambdaCodes whose resolved variables were read from each model, by id, as post_save
+# of any instance of that model must drop them; weak, so the registry never keeps a LambdaCode alive
+_input_watchers = defaultdict(weakref.WeakValueDictionary)
+_input_watchers_lock = threading.Lock()
+
+
+def _watch_inputs(lambda_code, models_read):
+    # registers lambda_code against every model its variables were read from, see LookupPlan.models
+    with _input_watchers_lock:
+        for model_read in models_read:
+            _input_watchers[model_read][id(lambda_code)] = lambda_code
+
+
+def _forget_watched_inputs(sender, instance, **kwargs):
+    with _input_watchers_lock:
+        watchers = _input_watchers.pop(sender, None)
+        watchers = watchers.values() if watchers else []
+
+    for lambda_code in watchers:
+        lambda_code._forget_inputs(instance)
+
+
+post_save.connect(_forget_watched_inputs, dispatch_uid='snippets.LambdaCode.inputs')
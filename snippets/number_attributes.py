@@ -1,7 +1,22 @@
 __author__ = 'cole'
 
+from collections import defaultdict
+from contextlib import contextmanager
+from fractions import gcd
+import heapq
 import itertools
 from operator import mul
+import os
+import random
+import struct
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # windows: PrimeCache extends its tables without a file lock
+
+import numpy as np  # pip install numpy
 
 
 def generator_length(iter):
@@ -11,42 +26,535 @@ def generator_length(iter):
         return sum(1 for _ in iter)
 
 
-def is_prime(n):
-    is_divisible = lambda n, p: not(n % p)
+SMALL_PRIME_LIMIT = 1 << 20  # is_prime answers n < SMALL_PRIME_LIMIT from a bitmap
 
-    if n <= 1:
-        return False
+_TRIAL_PRIMES = (3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47)
 
-    if n < 4:
-        return True
+# Miller-Rabin witnesses which are deterministic for every n below the given bound
+_DETERMINISTIC_WITNESSES = (
+    (4759123141, (2, 7, 61)),
+    (3317044064679887385961981, (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)),  # all 64-bit n
+)
 
-    if is_divisible(n, 2):
-        return False
 
-    if n < 9:
-        return True
+def _odd_prime_bitmap(limit):
+    '''
+    _odd_prime_bitmap(limit) returns a bytearray where bitmap[i] is 1
+    if 2 * i + 1 is prime, for 2 * i + 1 < limit
+    '''
 
-    if any([
-        is_divisible(n, 3),
-        is_divisible(n, 5),
-        is_divisible(n, 7),
-    ]):
-        return False
+    bitmap = bytearray([1]) * (limit // 2)
+    bitmap[0] = 0
+    i = 1
+    while (2 * i + 1) ** 2 < limit:
+        if bitmap[i]:
+            p = 2 * i + 1
+            bitmap[p * p // 2::p] = bytearray(len(xrange(p * p // 2, len(bitmap), p)))
+        i += 1
+    return bitmap
 
-    floor = (n ** 0.5) // 1
-    f = 5
-    while f <= floor:
-        if not n % f or not n % (f + 2):
-            return False
 
-        f += 6
+_small_prime_bitmap = _odd_prime_bitmap(SMALL_PRIME_LIMIT)
+
+
+def _miller_rabin(n, witnesses):
+    # True if n passes a Miller-Rabin round for every witness; n must be odd and > 3
+    d, s = n - 1, 0
+    while not d & 1:
+        d >>= 1
+        s += 1
+
+    for a in witnesses:
+        x = pow(a % n, d, n)
+        if x in (0, 1, n - 1):
+            continue
+
+        for _ in xrange(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
 
     return True
 
 
-def divisors_of_n(n):
-    from .number_generators import prime_factors_and_powers_for_n_generator
+def is_prime(n, rounds=25):
+    '''
+    is_prime(n) returns True if n is prime, using a tier for each size of n:
+        n < SMALL_PRIME_LIMIT: a lookup in a bitmap of odd primes
+        n within the tables of the persistent prime cache, if one is in use: a table lookup
+        n < 3.3 * 10 ** 24 (which covers 64-bit n): trial division by small primes,
+          then Miller-Rabin with a deterministic set of witnesses
+        larger n: the deterministic witnesses plus `rounds` random witnesses,
+          so a composite is reported prime with probability below 4 ** -rounds
+    '''
+
+    if n < SMALL_PRIME_LIMIT:
+        return n == 2 or (n > 2 and n & 1 == 1 and _small_prime_bitmap[n >> 1] == 1)
+
+    cached = _prime_cache and _prime_cache.is_prime(n)
+    if cached is not None:
+        return cached
+
+    if not n & 1 or any(n % p == 0 for p in _TRIAL_PRIMES):
+        return False
+
+    for bound, witnesses in _DETERMINISTIC_WITNESSES:
+        if n < bound:
+            return _miller_rabin(n, witnesses)
+
+    witnesses = _DETERMINISTIC_WITNESSES[-1][1] + tuple(random.randrange(2, n - 1) for _ in xrange(rounds))
+    return _miller_rabin(n, witnesses)
+
+
+def _pow_mod_many(bases, exponents, moduli):
+    # elementwise pow(bases, exponents, moduli) for uint64 arrays with moduli < 2 ** 32
+    result = np.ones_like(moduli)
+    bases, exponents = bases % moduli, exponents.copy()
+    while exponents.any():
+        odd = (exponents & 1).astype(np.bool_)
+        result[odd] = result[odd] * bases[odd] % moduli[odd]
+        bases = bases * bases % moduli
+        exponents >>= 1
+    return result
+
+
+def _miller_rabin_many(n, witnesses):
+    # vectorized _miller_rabin for a uint64 array of odd n with SMALL_PRIME_LIMIT <= n < 2 ** 32
+    d, s = n - 1, np.zeros_like(n)
+    while True:
+        even = (d & 1) == 0
+        if not even.any():
+            break
+        d[even] >>= 1
+        s[even] += 1
+
+    passed = np.ones(len(n), dtype=np.bool_)
+    for a in witnesses:
+        x = _pow_mod_many(np.full_like(n, a), d, n)
+        witnessed = (x == 1) | (x == n - 1)
+        for r in xrange(1, int(s.max()) if len(s) else 0):
+            x = x * x % n
+            witnessed |= (x == n - 1) & (r < s)
+        passed &= witnessed
+
+    return passed
+
+
+def is_prime_many(numbers):
+    '''
+    is_prime_many(numbers) returns a numpy boolean mask where mask[i] is is_prime(numbers[i])
+
+    numbers below SMALL_PRIME_LIMIT are looked up in the prime bitmap and numbers
+    below 2 ** 32 are tested with a vectorized deterministic Miller-Rabin;
+    anything larger falls back to is_prime
+    '''
+
+    numbers = np.asarray(numbers)
+    if numbers.dtype.kind not in 'iu':
+        return np.array([is_prime(int(n)) for n in numbers.ravel()], dtype=np.bool_).reshape(numbers.shape)
+
+    numbers_flat = numbers.ravel()
+    flat = numbers_flat.astype(np.int64)  # a uint64 of 2 ** 63 or more wraps negative, so only large holds it
+    large = numbers_flat >= 1 << 32
+    mask = np.zeros(len(flat), dtype=np.bool_)
+    bitmap = np.frombuffer(bytes(_small_prime_bitmap), dtype=np.uint8).astype(np.bool_)
+
+    small = (flat >= 0) & (flat < SMALL_PRIME_LIMIT)
+    mask[small] = (flat[small] == 2) | ((flat[small] & 1 == 1) & bitmap[flat[small] >> 1])
+
+    medium = (flat >= SMALL_PRIME_LIMIT) & ~large
+    candidates = flat[medium]
+    odd = (candidates & 1) == 1
+    for p in _TRIAL_PRIMES:
+        odd &= candidates % p != 0
+    medium_mask = np.zeros(len(candidates), dtype=np.bool_)
+    medium_mask[odd] = _miller_rabin_many(candidates[odd].astype(np.uint64), _DETERMINISTIC_WITNESSES[0][1])
+    mask[medium] = medium_mask
+
+    for i in np.flatnonzero(large).tolist():
+        mask[i] = is_prime(int(numbers_flat[i]))
+
+    return mask.reshape(numbers.shape)
+
+
+_TRIAL_DIVISION_PRIMES = tuple([2] + [2 * i + 1 for i in xrange(1, 500) if _small_prime_bitmap[i]])  # primes < 1000
+
+
+def _pollard_brent(n):
+    '''
+    _pollard_brent(n) returns a non-trivial factor of the odd composite n using
+    Pollard's rho with Brent's cycle detection, batching the gcd over m steps
+    '''
+
+    while True:
+        y, c, m = random.randrange(1, n), random.randrange(1, n), 128
+        g = r = q = 1
+
+        while g == 1:
+            x = y
+            for _ in xrange(r):
+                y = (y * y + c) % n
+
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in xrange(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = gcd(q, n)
+                k += m
+
+            r *= 2
+
+        if g == n:  # the batched product overshot, so step back one at a time
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = gcd(abs(x - ys), n)
+
+        if g != n:
+            return g
+
+
+def _isqrt(n):
+    # the integer square root of n, exact beyond float precision
+    return _integer_root(n, 2) if n > 0 else 0
+
+
+def _integer_root(n, k):
+    # the largest r where r ** k <= n, by Newton's method on ints
+    r = 1 << -(-n.bit_length() // k)  # an upper bound for the root
+    while True:
+        s = ((k - 1) * r + n // r ** (k - 1)) // k
+        if s >= r:
+            return r
+        r = s
+
+
+def _perfect_power(n):
+    # (root, k) with root ** k == n for the largest such k, or (n, 1)
+    for k in (p for p in _TRIAL_DIVISION_PRIMES if p < n.bit_length()):
+        root = _integer_root(n, k)
+        if root ** k == n:
+            root, j = _perfect_power(root)
+            return root, j * k
+    return n, 1
+
+
+def factorize(n):
+    '''
+    factorize(n) returns the sorted list of (prime, power) pairs for n,
+    e.g. factorize(360) = [(2, 3), (3, 2), (5, 1)]
+
+    n within the smallest prime factor table of the persistent prime cache is
+    factorized from the table; otherwise primes below 1000 are found by trial division, and whatever remains
+    is split into perfect powers or with Pollard's rho (Brent's variant)
+    until is_prime holds for each factor, so large prime factors are
+    never trial-divided
+    '''
+
+    factors = defaultdict(int)
+    if n < 2:
+        return []
+
+    cached = _prime_cache and _prime_cache.factorize(n)
+    if cached is not None:
+        return cached
+
+    for p in _TRIAL_DIVISION_PRIMES:
+        if p * p > n:
+            break
+        while n % p == 0:
+            factors[p] += 1
+            n //= p
+
+    remaining = [n] if n > 1 else []
+    while remaining:
+        m = remaining.pop()
+        if is_prime(m):
+            factors[m] += 1
+            continue
+
+        root, k = _perfect_power(m)  # rho is slow to split powers of one large prime
+        if k > 1:
+            remaining.extend([root] * k)
+        else:
+            d = _pollard_brent(m)
+            remaining.extend((d, m // d))
+
+    return sorted(factors.items())
+
+
+class SmallestPrimeFactorTable(object):
+    '''
+    SmallestPrimeFactorTable(limit) sieves the smallest prime factor of every n <= limit
+    into a compact uint32 array, self.spf, where spf[n] == n for primes and spf[0] == spf[1] == 0
+
+    path='spf.npy' keeps the table on disk: an existing table covering limit is
+    memory-mapped read-only instead of being sieved again, and a new table is saved
+    there and then memory-mapped, so processes share one page-cache copy;
+    without a path, the table of the persistent prime cache is used if one is in use
+
+    factorize(n) returns the (prime, power) pairs of n <= limit in O(log n) lookups
+    factorize_range(lo, hi) factorizes every n in [lo, hi) with array operations
+    '''
+
+    def __init__(self, limit, path=None):
+        assert 1 < limit < 1 << 32, "SmallestPrimeFactorTable limit must be between 2 and 2 ** 32"
+
+        if path is None and _prime_cache is not None:
+            self.spf = _prime_cache.spf_table(limit).spf
+            self.limit = len(self.spf) - 1
+            return
+
+        spf = self._load(path, limit) if path else None
+        if spf is None:
+            spf = self._sieve(limit)
+            if path:
+                with open(path, 'wb') as f:  # np.save(path) would append .npy to a path without it
+                    np.save(f, spf)
+                spf = np.load(path, mmap_mode='r')
+
+        self.spf = spf
+        self.limit = len(spf) - 1
+
+    @staticmethod
+    def _load(path, limit):
+        try:
+            spf = np.load(path, mmap_mode='r')
+        except (IOError, ValueError):  # missing, or not a saved array
+            return None
+        return spf if len(spf) > limit else None
+
+    @staticmethod
+    def _sieve(limit):
+        spf = np.zeros(limit + 1, dtype=np.uint32)
+        for p in xrange(2, _isqrt(limit) + 1):
+            if spf[p] == 0:
+                multiples = spf[p * p::p]
+                multiples[multiples == 0] = p
+
+        unmarked = np.flatnonzero(spf == 0)
+        spf[unmarked[unmarked > 1]] = unmarked[unmarked > 1]
+        return spf
+
+    def factorize(self, n):
+        assert 0 < n <= self.limit, "n must be between 1 and the table limit"
+
+        factors = []
+        while n > 1:
+            p, power = int(self.spf[n]), 0
+            while n % p == 0:
+                n //= p
+                power += 1
+            factors.append((p, power))
+        return factors
+
+    def factorize_range(self, lo, hi):
+        '''
+        factorize_range(lo, hi) returns (offsets, primes, powers) arrays where the
+        factorization of lo + i is zip(primes[offsets[i]:offsets[i + 1]], powers[offsets[i]:offsets[i + 1]])
+        '''
+
+        assert 0 <= lo <= hi <= self.limit + 1, "lo and hi must be within the table"
+
+        # divide every n by its smallest prime factor until it reaches 1; the kth
+        # division of every row still above 1 is recorded as one chunk of (rows, primes)
+        n = np.arange(lo, hi, dtype=np.int64)
+        rows = np.flatnonzero(n > 1)
+        n = n[rows]
+        chunks = []
+        while len(n):
+            p = self.spf[n].astype(np.int64)
+            chunks.append((rows, p))
+            n //= p
+            remaining = n > 1
+            rows, n = rows[remaining], n[remaining]
+
+        # row i divides in chunks 0 .. count[i] - 1, so its kth prime goes to start[i] + k
+        counts = np.bincount(np.concatenate([r for r, _ in chunks] or [[]]).astype(np.int64), minlength=hi - lo)
+        start = np.cumsum(counts) - counts
+        primes = np.empty(counts.sum(), dtype=np.int64)
+        for k, (chunk_rows, chunk_primes) in enumerate(chunks):
+            primes[start[chunk_rows] + k] = chunk_primes
+        rows = np.repeat(np.arange(hi - lo), counts)
 
+        # collapse repeated (row, prime) records into powers
+        first = np.ones(len(rows), dtype=np.bool_)
+        first[1:] = (rows[1:] != rows[:-1]) | (primes[1:] != primes[:-1])
+        starts = np.flatnonzero(first)
+        powers = np.diff(np.append(starts, len(rows)))
+        offsets = np.searchsorted(rows[starts], np.arange(hi - lo + 1))
+
+        return offsets, primes[starts], powers
+
+
+PRIME_CACHE_VERSION = 1
+PRIME_CACHE_LIMIT = (1 << 32) - 1  # the tables hold uint32 values
+_PRIME_CACHE_MAGIC = 'SNPC'
+_PRIME_CACHE_HEADER = struct.Struct('<4sIQQ8x')  # magic, version, limit, length; 32 bytes keeps the data aligned
+
+
+def _primes_up_to(limit):
+    # a uint32 array of the primes <= limit
+    odd = np.flatnonzero(np.frombuffer(_odd_prime_bitmap(limit + 1), dtype=np.uint8)) * 2 + 1
+    return np.concatenate(([2] if limit >= 2 else [], odd)).astype(np.uint32)
+
+
+class PrimeCache(object):
+    '''
+    PrimeCache(directory) keeps a table of primes and a smallest prime factor table
+    on disk, shared by every process using the same directory:
+        directory/primes.v1.bin: the primes <= the table's limit
+        directory/spf.v1.bin: the smallest prime factor of every n <= the table's limit
+
+    each file is a versioned header followed by a uint32 array, which is memory-mapped
+    read-only, so a fleet of processes shares one page-cache copy. A file of another
+    version, or a corrupt one, is ignored and rebuilt
+
+    a table is extended on demand, to at least twice its limit, under an exclusive lock
+    on directory/.lock; the larger table is written to a temporary file and renamed over
+    the old one, so a reader never sees a partial table
+
+        primes(limit), spf_table(limit): the tables, extended to cover limit if needed
+        is_prime(n), factorize(n): answers from the tables as they are, or None
+            when n is beyond them; these never extend a table
+
+    use_prime_cache(directory), or the SNIPPETS_PRIME_CACHE environment variable, makes
+    is_prime, factorize, SmallestPrimeFactorTable and prime_generator consult the cache first
+    '''
+
+    def __init__(self, directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            assert os.path.isdir(directory), "PrimeCache directory must be a directory"
+
+        self.directory = directory
+        self._tables = {}
+
+    def primes(self, limit=None):
+        '''
+        primes(limit) returns a read-only uint32 array of the primes <= limit;
+        primes() returns every prime in the table, without extending it
+        '''
+
+        table_limit, primes = self._table('primes', limit)
+        return primes if limit is None or limit >= table_limit else primes[:np.searchsorted(primes, limit, 'right')]
+
+    def primes_limit(self):
+        # the limit of the primes table as it is, without extending it
+        return self._table('primes')[0]
+
+    def spf_table(self, limit=None):
+        # a SmallestPrimeFactorTable over the memory-mapped table, covering at least limit
+        table = SmallestPrimeFactorTable.__new__(SmallestPrimeFactorTable)
+        table.spf = self._table('spf', limit)[1]
+        table.limit = len(table.spf) - 1
+        return table
+
+    def is_prime(self, n):
+        spf_limit, spf = self._table('spf')
+        if n <= spf_limit:
+            return bool(n > 1 and spf[n] == n)
+
+        primes_limit, primes = self._table('primes')
+        if n <= primes_limit:
+            i = np.searchsorted(primes, n)
+            return bool(i < len(primes) and primes[i] == n)
+
+    def factorize(self, n):
+        if n <= self._table('spf')[0]:
+            return self.spf_table().factorize(n)
+
+    def _path(self, kind):
+        return os.path.join(self.directory, '%s.v%d.bin' % (kind, PRIME_CACHE_VERSION))
+
+    def _table(self, kind, limit=None):
+        # (limit, values) of a table: as loaded, re-read from disk, or extended to cover limit
+        table = self._tables.get(kind)
+        if table is None or limit is not None and table[0] < limit:
+            table = self._read(kind)
+            if limit is not None and table[0] < limit:
+                table = self._extend(kind, limit, table[0])
+            self._tables[kind] = table
+        return table
+
+    def _read(self, kind):
+        # the (limit, values) table on disk; (0, empty) when missing, of another version or corrupt
+        path = self._path(kind)
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_PRIME_CACHE_HEADER.size)
+            size = os.path.getsize(path)
+        except (IOError, OSError):
+            return 0, np.zeros(0, dtype=np.uint32)
+
+        if len(header) == _PRIME_CACHE_HEADER.size:
+            magic, version, limit, length = _PRIME_CACHE_HEADER.unpack(header)
+            if magic == _PRIME_CACHE_MAGIC and version == PRIME_CACHE_VERSION and \
+                    length and size == _PRIME_CACHE_HEADER.size + 4 * length:
+                return limit, np.memmap(path, dtype='<u4', mode='r', offset=_PRIME_CACHE_HEADER.size, shape=(length,))
+
+        return 0, np.zeros(0, dtype=np.uint32)
+
+    @contextmanager
+    def _lock(self):
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _extend(self, kind, limit, table_limit):
+        assert limit <= PRIME_CACHE_LIMIT, "PrimeCache tables are limited to 2 ** 32 - 1"
+
+        with self._lock():
+            table = self._read(kind)  # another process may have extended the table while this one waited
+            if table[0] >= limit:
+                return table
+
+            limit = min(max(limit, 2 * table_limit, 2), PRIME_CACHE_LIMIT)
+            values = _primes_up_to(limit) if kind == 'primes' else SmallestPrimeFactorTable._sieve(limit)
+
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(_PRIME_CACHE_HEADER.pack(_PRIME_CACHE_MAGIC, PRIME_CACHE_VERSION, limit, len(values)))
+                f.write(values.astype('<u4').tostring())
+            os.rename(temporary, self._path(kind))
+
+            return self._read(kind)
+
+
+_prime_cache = None
+
+
+def use_prime_cache(directory):
+    '''
+    use_prime_cache(directory) makes is_prime, factorize, SmallestPrimeFactorTable and
+    prime_generator consult a PrimeCache in directory first, and returns it;
+    use_prime_cache(None) stops using the cache
+    '''
+
+    global _prime_cache
+    _prime_cache = PrimeCache(directory) if directory else None
+    return _prime_cache
+
+
+def get_prime_cache():
+    # the PrimeCache in use, or None
+    return _prime_cache
+
+
+use_prime_cache(os.environ.get('SNIPPETS_PRIME_CACHE'))
+
+
+def divisors_of_n(n):
     ##  WORKFLOW ##
     #  1. get the (factor, power) for each factor in n
     #  2. create a list of divisors for each prime, e.g. [[1, 2, 4, 8], [1, 3, 9, 27], [1, 5, 25, 125]]
@@ -54,7 +562,7 @@ def divisors_of_n(n):
     #    e.g. [[1,1,1], [2,1,1], [1,3,1], [1,1,5], [2,3,1], ..., [8,27,125]]
     #  4. the divisors of n are list of products of each combination of prime divisors
 
-    factors_and_powers = prime_factors_and_powers_for_n_generator(n)
+    factors_and_powers = factorize(n)
     prime_divisors = [[f ** x for x in xrange(0, p + 1)] for f, p in factors_and_powers]
 
     combinations_of_prime_divisors = itertools.product(*prime_divisors)  # Step 3
@@ -62,25 +570,157 @@ def divisors_of_n(n):
     return sorted(list(divisor_generator))
 
 
+def divisor_count_and_sum(n, factors_and_powers=None):
+    '''
+    divisor_count_and_sum(n) returns (d(n), sigma(n)), the number and the sum of the divisors of n,
+    straight from the (prime, power) factorization without listing the divisors:
+        d(n) = product of (k + 1), sigma(n) = product of (p ** (k + 1) - 1) / (p - 1)
+    '''
+
+    count, total = 1, 1
+    for p, k in factors_and_powers or factorize(n):
+        count *= k + 1
+        total *= (p ** (k + 1) - 1) // (p - 1)
+    return count, total
+
+
+def divisors_in_order(n):
+    '''
+    divisors_in_order(n) yields the divisors of n in increasing order, merging with a heap
+    instead of sorting them all, so the smallest divisors come first and cheaply
+
+    each divisor is reached once, as its primes multiplied in non-decreasing order:
+    a heap entry (d, i, e) is divisor d whose largest prime is primes[i], to the power e
+    '''
+
+    factors_and_powers = factorize(n)
+    heap = [(1, 0, 0)]
+    while heap:
+        d, i, e = heapq.heappop(heap)
+        yield d
+
+        for j in xrange(i, len(factors_and_powers)):
+            p, k = factors_and_powers[j]
+            if j > i or e < k:
+                heapq.heappush(heap, (d * p, j, e + 1 if j == i else 1))
+
+
+def divisor_counts_and_sums(numbers):
+    '''
+    divisor_counts_and_sums(numbers) returns the list of (d(n), sigma(n)) for each n in numbers;
+    when every n is below SMALL_PRIME_LIMIT they are factorized from one SmallestPrimeFactorTable
+    '''
+
+    numbers = list(numbers)
+    if not numbers:
+        return []
+
+    assert min(numbers) > 0, "numbers must be positive"
+    largest = max(numbers)
+    if 1 < largest < SMALL_PRIME_LIMIT:
+        table = SmallestPrimeFactorTable(largest)
+        return [divisor_count_and_sum(n, table.factorize(n)) for n in numbers]
+    return [divisor_count_and_sum(n) for n in numbers]
+
+
+def multiplicative_functions(less_than, spf_table=None):
+    '''
+    multiplicative_functions(less_than) returns a dict of int64 numpy arrays indexed by n,
+    for 0 <= n < less_than (index 0 holds 0):
+        'divisor_count': the number of divisors of n, d(n)
+        'divisor_sum': the sum of the divisors of n, sigma(n)
+        'totient': Euler's totient, phi(n)
+        'mobius': the Mobius function, mu(n)
+
+    each function is multiplicative, so it is the product of its value on each prime power
+    p ** e exactly dividing n; starting from the smallest prime factor table, every n is
+    divided by its smallest prime power at once, for all n together, until it reaches 1
+    '''
+
+    functions = dict((name, np.ones(max(less_than, 0), dtype=np.int64))
+                     for name in ('divisor_count', 'divisor_sum', 'totient', 'mobius'))
+    if less_than < 3:
+        for values in functions.values():
+            values[:1] = 0
+        return functions
+
+    spf = (spf_table or SmallestPrimeFactorTable(less_than - 1)).spf
+    rows = np.arange(2, less_than, dtype=np.int64)
+    m = rows.copy()
+
+    while len(rows):
+        p = spf[m].astype(np.int64)
+        e, pk = np.zeros(len(rows), dtype=np.int64), np.ones(len(rows), dtype=np.int64)
+        divisible = np.ones(len(rows), dtype=np.bool_)
+        while divisible.any():
+            m[divisible] //= p[divisible]
+            e[divisible] += 1
+            pk[divisible] *= p[divisible]
+            divisible = m % p == 0
+
+        functions['divisor_count'][rows] *= e + 1
+        functions['divisor_sum'][rows] *= (pk * p - 1) // (p - 1)
+        functions['totient'][rows] *= pk // p * (p - 1)
+        functions['mobius'][rows] *= np.where(e == 1, -1, 0)
+
+        remaining = m > 1
+        rows, m = rows[remaining], m[remaining]
+
+    for values in functions.values():
+        values[0] = 0
+    return functions
+
+
+class DivisorLists(object):
+    '''
+    DivisorLists is the sequence returned by divisors_for_n_less_than, held as two flat
+    arrays in CSR form rather than as a list of lists: the divisors of n are
+    values[offsets[n - 1]:offsets[n]], in increasing order
+
+    divisor_lists[i] materializes the divisor list for n = i + 1
+    '''
+
+    def __init__(self, offsets, values):
+        self.offsets, self.values = offsets, values
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self)))]
+
+        i = i + len(self) if i < 0 else i
+        if not 0 <= i < len(self):
+            raise IndexError('DivisorLists index out of range')
+        return self.values[self.offsets[i]:self.offsets[i + 1]].tolist()
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+
 def divisors_for_n_less_than(less_than):
     '''
-    divisors_for_n_less_than(less_than) returns a list of lists. The divisor list for number n
-    is the n-1 index in the list of lists. The return starts [[1], [1,2], [1,3], [1,2,4], ...]
+    divisors_for_n_less_than(less_than) returns a DivisorLists sequence of lists. The divisor list for number n
+    is the n-1 index in the sequence. The return starts [[1], [1,2], [1,3], [1,2,4], ...]
     '''
 
     ## ALGORITHM WORKFLOW
-    # 1. assemble a list of lists of [1] where list length is (less_than - 1) (which handles divisor = 1)
-    # 2. start with divisor = 2, and for every 2nd list append 2 (the 0th list is for n = 1, etc.)
-    # 3. count up the divisors until divisor = less_than, e.g. if less_than = 100 and divisor = 99,
-    #    the algorithm give an end condition where xrange(98, 99, 99) = 98,
-    #    which is the 99th list i.e. divisor_lists[98], and appends 99 (divisor = 99)
+    # 1. the number of divisors of each n gives the offsets of each n's divisors in one flat array
+    # 2. every (divisor, multiple) pair is generated at once: divisor d has (less_than - 1) // d multiples
+    # 3. a stable sort by multiple groups the pairs by n, keeping each n's divisors in increasing order
 
-    divisor_lists = [[1] for _ in xrange(less_than-1)]
-    divisor = 2
+    numbers = np.arange(1, max(less_than, 1), dtype=np.int64)
+    counts = multiplicative_functions(less_than)['divisor_count'][1:]
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
 
-    while divisor < less_than:
-        for i in xrange(divisor-1, less_than-1, divisor):
-            divisor_lists[i].append(divisor)
-        divisor += 1
+    multiples_per_divisor = (less_than - 1) // numbers
+    divisors = np.repeat(numbers, multiples_per_divisor)
+    first_pair = np.repeat(np.cumsum(multiples_per_divisor) - multiples_per_divisor, multiples_per_divisor)
+    multiples = divisors * (np.arange(len(divisors)) - first_pair + 1)
 
-    return divisor_lists
\ No newline at end of file
+    return DivisorLists(offsets, divisors[np.argsort(multiples, kind='mergesort')])
@@ -1,13 +1,31 @@
 __author__ = 'cole'
 
-from collections import Iterable
+from array import array
+from collections import Iterable, deque
+from functools import partial
 import itertools
+import math
+import multiprocessing
+from operator import gt
 import warnings
 
-from .number_attributes import is_prime
+import numpy as np  # pip install numpy
 
+from .number_attributes import PRIME_CACHE_LIMIT, _isqrt, factorize, get_prime_cache, is_prime
 
-def generator_limiter(generator=None, limit=None, count=None, filter_by=None, last_only=False, as_tuple=0):
+
+SEGMENT_SIZE = 1 << 18  # odd numbers per sieve segment; a 256KB bytearray which fits in L2 cache
+POOL_SEGMENTS = 16  # segments sieved by each task of a process pool, so sieving outweighs passing the primes back
+BLOCK_SIZE = 4096  # values per block in the batched (block_size=n) mode of the generators
+
+try:
+    _INT64_TYPECODE = array('q').typecode
+except ValueError:
+    _INT64_TYPECODE = 'l'  # python 2's array has no 'q'; 'l' is 64 bits on LP64 platforms
+
+
+def generator_limiter(generator=None, limit=None, count=None, filter_by=None, last_only=False, as_tuple=0,
+                      pipeline=False):
     '''
     generator_limiter(generator, limit, count, filter_by, last_only, as_tuple)
     will operate the given generator within the conditions established by limit,
@@ -17,7 +35,8 @@ def generator_limiter(generator=None, limit=None, count=None, filter_by=None, la
         limits as detailed by limit, count, last_only and as_tuple. It defaults to
         itertools.count if no generator is provided.
 
-        limit: stops the generator if the next yield value is not less than the limit
+        limit: stops the generator if the next yield value is not less than the limit,
+        or, if limit is callable, once limit(value) is False
 
         count: limits the number of yielded results to count
 
@@ -28,6 +47,9 @@ def generator_limiter(generator=None, limit=None, count=None, filter_by=None, la
         is set to True. Combine with count for infinite generators.
 
         as_tuple: yields results as a tuple of value set by as_tuple=x.
+
+        pipeline: composes the stages once as a chain of itertools iterators, see
+        generator_pipeline, instead of testing every condition for every value
     '''
 
     if count:
@@ -38,30 +60,77 @@ def generator_limiter(generator=None, limit=None, count=None, filter_by=None, la
             warnings.warn('count is a float value and will be truncated to nearest int')
             count = int(count)
 
-    is_within_limit = limit and (lambda x: x < limit) or (lambda x: True)
+    if pipeline:
+        return generator_pipeline(generator, limit, count, filter_by, last_only, as_tuple)
+    return _generator_limiter(generator, limit, count, filter_by, last_only, as_tuple)
+
+
+def generator_pipeline(generator=None, limit=None, count=None, filter_by=None, last_only=False, as_tuple=0):
+    '''
+    generator_pipeline takes the arguments of generator_limiter and returns the same values,
+    from a chain of itertools stages built once, so no python code runs per value
+    other than the generator itself and the filter_by and callable limit functions:
+
+        generator -> ifilter(filter_by) -> takewhile(limit) -> izip grouper(as_tuple) -> islice(count)
+
+    last_only drains the chain into a deque of length 1
+    '''
+
+    values = generator or itertools.count()
+
+    if filter_by:
+        values = itertools.ifilter(filter_by, values)
+
+    if limit is not None:
+        values = itertools.takewhile(limit if callable(limit) else partial(gt, limit), values)
+
+    if as_tuple:
+        values = itertools.izip(*[iter(values)] * as_tuple)
+
+    if count:
+        values = itertools.islice(values, count)
+
+    if last_only:
+        return _last_value(values, as_tuple)
+    return values
+
+
+def _last_value(values, as_tuple):
+    # as generator_limiter, last_only with as_tuple yields an empty tuple when no tuple completes
+    last = deque(values, maxlen=1)
+    if last:
+        yield last[0]
+
+    elif as_tuple:
+        yield tuple()
+
+
+def _generator_limiter(generator, limit, count, filter_by, last_only, as_tuple):
+    is_within_limit = callable(limit) and limit or limit is not None and (lambda x: x < limit) or (lambda x: True)
     generator = generator or itertools.count()
 
     if filter_by:
         generator = itertools.ifilter(filter_by, generator)
 
+    exhausted = object()  # stands in for the next value once a finite generator runs out
     gen_instance = enumerate(generator)
-    index, value = gen_instance.next()
-    last_value, tuple_values, last_tuple, yielded = value, tuple(), tuple(), 0
+    index, value = next(gen_instance, (0, exhausted))
+    last_value, tuple_values, last_tuple = exhausted, tuple(), tuple()
 
-    while is_within_limit(value):
+    while value is not exhausted and is_within_limit(value):
         if as_tuple:
             tuple_values += (value,)
             if len(tuple_values) == as_tuple:
                 last_tuple, tuple_values = tuple_values, tuple()
 
             else:
-                index, value = gen_instance.next()
+                index, value = next(gen_instance, (index + 1, exhausted))
                 continue
 
         if not last_only:
             yield as_tuple and last_tuple or value
 
-        last_value, (index, value) = value, gen_instance.next()
+        last_value, (index, value) = value, next(gen_instance, (index + 1, exhausted))
 
         if count > 0:
             counted = as_tuple and index // as_tuple or index
@@ -72,11 +141,74 @@ def generator_limiter(generator=None, limit=None, count=None, filter_by=None, la
         if as_tuple:
             yield last_tuple
 
-        else:
+        elif last_value is not exhausted:
             yield last_value
 
 
-def count_generator(*args):
+def _int64_block(values, as_numpy=False):
+    # one block of values as array('q') or an int64 numpy array, or, when a value
+    # overflows 64 bits, as a list (as_numpy: an object array) of python ints
+    try:
+        return np.array(values, dtype=np.int64) if as_numpy else array(_INT64_TYPECODE, values)
+    except OverflowError:
+        return np.array(values, dtype=object) if as_numpy else list(values)
+
+
+def _numpy_block(block, as_numpy=False):
+    # an int64 numpy block as returned by the batched mode
+    if as_numpy:
+        return block
+    if array(_INT64_TYPECODE).itemsize == 8:
+        return array(_INT64_TYPECODE, block.astype(np.int64).tostring())
+    return _int64_block(block.tolist())
+
+
+def number_blocks(values, block_size=BLOCK_SIZE, as_numpy=False):
+    '''
+    number_blocks(values, block_size) yields the values of a number generator in blocks
+    of block_size values, the last block possibly shorter, as array('q') blocks or, with
+    as_numpy=True, int64 numpy arrays
+
+    a block holding a value which overflows 64 bits falls back to a list of python ints
+    (as_numpy: a numpy object array), so no value is ever truncated
+
+    this is the batched mode behind the block_size=n argument of the generators below
+    '''
+
+    assert block_size > 0, "block_size must be a positive int"
+
+    values = iter(values)
+    while True:
+        block = list(itertools.islice(values, block_size))
+        if not block:
+            return
+        yield _int64_block(block, as_numpy)
+
+
+def _numpy_blocks(arrays, block_size=BLOCK_SIZE, as_numpy=False, count=None):
+    # re-cuts a stream of numpy arrays into blocks of block_size values, stopping after count values
+    pending, pending_size = [], 0
+    for values in arrays:
+        if count is not None:
+            values, count = values[:count], count - min(len(values), count)
+
+        pending.append(values)
+        pending_size += len(values)
+        if pending_size >= block_size:
+            values = np.concatenate(pending)
+            whole = len(values) - len(values) % block_size
+            for i in xrange(0, whole, block_size):
+                yield _numpy_block(values[i:i + block_size], as_numpy)
+            pending, pending_size = [values[whole:]], len(values) - whole
+
+        if count == 0:
+            break
+
+    if pending_size:
+        yield _numpy_block(np.concatenate(pending), as_numpy)
+
+
+def count_generator(*args, **block_options):
     '''
     count_generator() is designed to be counting iterator which allows for
     a more intuitive use of arguments, inferring appropriate
@@ -101,8 +233,19 @@ def count_generator(*args):
     special 3 argument case, with None as the 2nd argument: "Count from X in steps of Z".
     e.g.: count_generator(3, None, -2) counts 3, 1, -1 ..
       this case is an extension of the 2 argument case using None as the 2nd argument
+
+    block_size=n yields blocks of n counts instead, see number_blocks; as_numpy=True
+    makes the blocks int64 numpy arrays
     '''
 
+    assert set(block_options) <= set(['block_size', 'as_numpy']), 'only block_size and as_numpy are options'
+
+    numbers = _count_generator(*args)
+    return number_blocks(numbers, **block_options) if block_options.get('block_size') else numbers
+
+
+def _count_generator(*args):
+
     assert len(args) < 4, 'Uses only start, stop, step values'
 
     args = list(args)
@@ -154,6 +297,61 @@ def _fibonacci_generator():
         a, b = b, a + b
 
 
+def _fibonacci_pair(n, m=0):
+    # (F(n), F(n + 1)) by fast doubling over the bits of n, high bit first, reduced mod m if m:
+    #   F(2k) = F(k) * (2 * F(k + 1) - F(k)),  F(2k + 1) = F(k) ** 2 + F(k + 1) ** 2
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        a, b = a * (2 * b - a), a * a + b * b
+        if bit == '1':
+            a, b = b, a + b
+        if m:
+            a, b = a % m, b % m
+    return a, b
+
+
+def fibonacci(n):
+    '''
+    fibonacci(n) returns the nth fibonacci number, F(0) = 0, F(1) = F(2) = 1,
+    by fast doubling in O(log n) big integer multiplications
+    '''
+
+    assert n >= 0, "n must be a non-negative integer"
+    return _fibonacci_pair(n)[0]
+
+
+def fibonacci_mod(n, m):
+    '''
+    fibonacci_mod(n, m) returns F(n) % m without computing F(n) itself
+    '''
+
+    assert n >= 0 and m > 0, "n must be non-negative and m positive"
+    return _fibonacci_pair(n, m)[0] % m
+
+
+_LOG_PHI = math.log((1 + math.sqrt(5)) / 2)
+_LOG_SQRT_5 = math.log(math.sqrt(5))
+
+
+def fibonacci_index_below(limit):
+    '''
+    fibonacci_index_below(limit) returns the largest k with F(k) < limit, for limit > 0
+
+    k is estimated from Binet's formula, F(k) ~ phi ** k / sqrt(5), so k ~ log(limit * sqrt(5)) / log(phi),
+    and then corrected by a step or two against the exact F(k), F(k + 1) pair
+    '''
+
+    assert limit > 0, "limit must be positive"
+
+    k = max(int((math.log(limit) + _LOG_SQRT_5) / _LOG_PHI), 0)
+    a, b = _fibonacci_pair(k)
+    while a >= limit:
+        k, a, b = k - 1, b - a, a
+    while b < limit:
+        k, a, b = k + 1, b, a + b
+    return k
+
+
 def fibonacci_generator(as_tuple=False, limit=None, last_only=False):
     '''
     fibonacci_generator(as_tuple=False, limit=None) yields the classic sequence of fibonacci numbers.
@@ -164,11 +362,19 @@ def fibonacci_generator(as_tuple=False, limit=None, last_only=False):
 
         when using both as as_tuple and limit, the a tuple is returned only if all
         tuple numbers are less than the limit
+
+        last_only=True with a numeric limit jumps straight to the last number below it
+        with fibonacci_index_below and fibonacci, rather than walking the sequence
     '''
 
+    if last_only and limit and not as_tuple and not callable(limit):
+        index = fibonacci_index_below(limit)
+        return iter([fibonacci(index)] if index > 0 else [])
+
     if as_tuple or limit or last_only:
         as_tuple = as_tuple and 3 or 0
-        return generator_limiter(_fibonacci_generator(), limit=limit, last_only=last_only, as_tuple=as_tuple)
+        return generator_limiter(_fibonacci_generator(), limit=limit, last_only=last_only, as_tuple=as_tuple,
+                                 pipeline=True)
 
     else:
         return _fibonacci_generator()
@@ -223,21 +429,171 @@ def _prime_generator():
             #  q=385: x = 385 + 14 = 399 then 413, 413 % 30 = 23, and 413 into D
 
 
-def prime_generator(count=None, limit=None, last_only=False):
+def _small_primes(limit):
+    '''
+    _small_primes(limit) returns a numpy array of the primes <= limit,
+    using a simple sieve of Eratosthenes over odd numbers
+    '''
+
+    if limit < 2:
+        return np.array([], dtype=np.int64)
+
+    sieve = np.ones((limit + 1) // 2, dtype=np.bool_)  # sieve[i] represents 2 * i + 1
+    sieve[0] = False
+    for i in xrange(1, (int(limit ** 0.5) + 1) // 2 + 1):
+        if sieve[i]:
+            p = 2 * i + 1
+            sieve[p * p // 2::p] = False
+
+    return np.concatenate(([2], 2 * np.flatnonzero(sieve) + 1)).astype(np.int64)
+
+
+def _sieve_segment(bounds):
+    '''
+    _sieve_segment((lo, hi)) returns a numpy array of the primes in [lo, hi)
+
+    only odd numbers are sieved: segment[i] represents first + 2 * i,
+    and each base prime p <= sqrt(hi) strikes out its odd multiples
+    from max(p * p, first multiple of p in the segment)
+    '''
+
+    lo, hi = bounds
+    lo = max(lo, 2)
+    if hi <= lo:
+        return np.array([], dtype=np.int64)
+
+    first = lo | 1
+    segment = np.ones(max(0, (hi - first + 1) // 2), dtype=np.bool_)
+
+    for p in _small_primes(_isqrt(hi - 1))[1:].tolist():
+        multiple = max(p * p, (first + p - 1) // p * p)
+        if not multiple & 1:
+            multiple += p
+        segment[(multiple - first) // 2::p] = False
+
+    primes = first + 2 * np.flatnonzero(segment).astype(np.int64)
+    if first == 1:
+        primes = primes[1:]
+    if lo == 2:
+        primes = np.concatenate(([2], primes)).astype(np.int64)
+    return primes
+
+
+def _segment_bounds(lo, hi=None, segment_size=SEGMENT_SIZE):
+    # yields (lo, hi) segment bounds, starting small and doubling to segment_size odd numbers
+    size = min(1 << 12, segment_size)
+    while hi is None or lo < hi:
+        seg_hi = lo + 2 * size if hi is None else min(lo + 2 * size, hi)
+        yield lo, seg_hi
+        lo, size = seg_hi, min(size * 2, segment_size)
+
+
+def prime_segments(lo=2, hi=None, segment_size=SEGMENT_SIZE, processes=None):
+    '''
+    prime_segments(lo, hi) yields numpy arrays of the successive primes in [lo, hi),
+    one array per segment of a segmented sieve of Eratosthenes, so memory is bounded
+    by segment_size rather than by the number of primes found.
+
+        hi=None sieves indefinitely
+
+        processes=n sieves in a multiprocessing pool of n processes (processes=0 uses one
+        process per cpu), each task sieving POOL_SEGMENTS segments' worth at once; segments
+        are still yielded in order. the primes found are pickled back from the pool, which
+        costs about as much as sieving them, so a pool only pays off over very large
+        ranges on several cores, and is slower than processes=None otherwise
+    '''
+
+    if processes is None:
+        for segment in itertools.imap(_sieve_segment, _segment_bounds(lo, hi, segment_size)):
+            yield segment
+        return
+
+    bounds = _segment_bounds(lo, hi, segment_size * POOL_SEGMENTS)
+
+    pool = multiprocessing.Pool(processes or None)
+    try:
+        batch_size = 2 * (processes or multiprocessing.cpu_count())
+        while True:
+            batch = list(itertools.islice(bounds, batch_size))
+            if not batch:
+                break
+            for segment in pool.map(_sieve_segment, batch):
+                yield segment
+    finally:
+        pool.terminate()
+
+
+def _nth_prime_bound(n):
+    # an upper bound on the nth prime: n * (ln n + ln ln n) for n >= 6
+    return 13 if n < 6 else int(n * (math.log(n) + math.log(math.log(n)))) + 1
+
+
+def _cached_prime_segments(hi=None, count=None, processes=None):
+    '''
+    _cached_prime_segments(hi, count) yields numpy arrays of the successive primes below hi,
+    as prime_segments(2, hi) does, serving them from the persistent prime cache when one
+    is in use: the cache is extended to cover hi, or the count-th prime when hi is None,
+    and any primes beyond the cache's limit are sieved as usual
+    '''
+
+    cache = get_prime_cache()
+    if cache is None:
+        for segment in prime_segments(2, hi, processes=processes):
+            yield segment
+        return
+
+    covers = hi - 1 if hi else count and _nth_prime_bound(count)
+    primes = cache.primes(min(covers, PRIME_CACHE_LIMIT)) if covers else cache.primes()
+    table_limit = max(cache.primes_limit(), 1)
+    if hi:
+        primes = primes[:np.searchsorted(primes, hi)]
+
+    for i in xrange(0, len(primes), SEGMENT_SIZE):
+        yield primes[i:i + SEGMENT_SIZE].astype(np.int64)
+
+    if hi is None or hi > table_limit + 1:
+        for segment in prime_segments(table_limit + 1, hi, processes=processes):
+            yield segment
+
+
+def primes_in_range(lo=2, hi=None, segment_size=SEGMENT_SIZE, processes=None):
+    '''
+    primes_in_range(lo, hi) yields the successive primes in [lo, hi),
+    streamed segment by segment from prime_segments
+    '''
+
+    for segment in prime_segments(lo, hi, segment_size, processes):
+        for prime in segment.tolist():
+            yield prime
+
+
+def prime_generator(count=None, limit=None, last_only=False, processes=None, block_size=None, as_numpy=False):
     '''
     prime_generator(count=None, limit=None) yields successive prime numbers
         count=n will limit the number of primes to n
         limit=n will strop yielding primes once the next prime will exceed limit=n
+        processes=n sieves with a pool of n processes; see prime_segments
+        block_size=n yields blocks of n primes, see number_blocks, cut straight
+        from the sieve's segment arrays
+
+    primes are generated by the segmented sieve in prime_segments, or read from
+    the persistent prime cache when one is in use; see number_attributes.PrimeCache
     '''
 
-    if count or limit or last_only:
-        limit_value = limit and limit or 0
-        limit = limit and (lambda x: x < limit_value) or None
+    limit = int(math.ceil(limit)) if limit else None  # e.g. limit=2e6
+    segments = _cached_prime_segments(limit, count, processes)
+
+    if block_size and not last_only:
+        assert block_size > 0, "block_size must be a positive int"
+        return _numpy_blocks(segments, block_size, as_numpy, count)
+
+    primes = (prime for segment in segments for prime in segment.tolist())
 
-        return generator_limiter(_prime_generator(), limit=limit, count=count, last_only=last_only)
+    if count or last_only:
+        return generator_limiter(primes, count=count, last_only=last_only, pipeline=True)
 
     else:
-        return _prime_generator()
+        return primes
 
 
 #### COLE'S OLD PRIME GENERATOR, LEFT HERE FOR SHOW ####
@@ -272,17 +628,8 @@ def prime_generator(count=None, limit=None, last_only=False):
 
 
 def prime_factor_generator(number):
-    primes = prime_generator()
-    prime = primes.next()
-
-    while prime <= number:
-        if number % prime == 0:
-            yield prime
-
-        while number % prime == 0:
-            number /= prime
-
-        prime = primes.next()
+    for prime, _ in factorize(number):
+        yield prime
 
 
 def prime_divisor_generator(limit, prime_factors=None):
@@ -296,25 +643,27 @@ def prime_divisor_generator(limit, prime_factors=None):
 
 
 def prime_factors_and_powers_for_n_generator(n):
-    prime_factors = prime_factor_generator(n)
-
-    for prime_factor in prime_factors:
-        power, number = 0, n
-        while number % prime_factor == 0:
-            power += 1
-            number /= prime_factor
-
+    for prime_factor, power in factorize(n):
         yield prime_factor, power
 
 
-def palindromic_number_generator(*args):
+def palindromic_number_generator(*args, **block_options):
     '''
     palindromic_number_generator yields palindromes from a range of numbers
     the sequence begins 11, 22, .. 1001, 1111, 1221,  ..
 
     0 is not considered a palindromic number
+
+    block_size=n yields blocks of n palindromes instead, see number_blocks
     '''
 
+    assert set(block_options) <= set(['block_size', 'as_numpy']), 'only block_size and as_numpy are options'
+
+    palindromes = _palindromic_number_generator(*args)
+    return number_blocks(palindromes, **block_options) if block_options.get('block_size') else palindromes
+
+
+def _palindromic_number_generator(*args):
     numbers = count_generator(*args)
 
     while True:
@@ -333,7 +682,25 @@ def bound_triplet_generator(triplet_total):
             yield a, b, triplet_total - a - b
 
 
-def triangle_number_generator():
+_TRIANGLE_INT64_LIMIT = 3037000499  # the largest k for which k * (k + 1) fits in an int64
+
+
+def triangle_number_generator(block_size=None, as_numpy=False):
+    '''
+    triangle_number_generator() yields the triangle numbers 1, 3, 6, 10, ..
+
+    block_size=n yields blocks of n triangle numbers instead, see number_blocks,
+    each block computed at once as k * (k + 1) / 2
+    '''
+
+    if block_size:
+        assert block_size > 0, "block_size must be a positive int"
+        return _triangle_number_blocks(block_size, as_numpy)
+
+    return _triangle_number_generator()
+
+
+def _triangle_number_generator():
     numbers = itertools.count()
     triangle_number = numbers.next()
     while True:
@@ -341,6 +708,15 @@ def triangle_number_generator():
         yield triangle_number
 
 
+def _triangle_number_blocks(block_size, as_numpy):
+    for k in itertools.count(1, block_size):
+        if k + block_size <= _TRIANGLE_INT64_LIMIT:
+            k = np.arange(k, k + block_size, dtype=np.int64)
+            yield _numpy_block(k * (k + 1) // 2, as_numpy)
+        else:
+            yield _int64_block([j * (j + 1) // 2 for j in xrange(k, k + block_size)], as_numpy)
+
+
 def collatz_generator(n):
     '''
     collatz_generator(n) yields a sequence of numbers according to two rules:
@@ -353,7 +729,19 @@ def collatz_generator(n):
         yield n
 
 
-def multiples_of_n_less_than(n, less_than):
+def multiples_of_n_less_than(n, less_than, block_size=None, as_numpy=False):
+    '''
+    multiples_of_n_less_than(n, less_than) yields n, n ** 2, n ** 3, .. while less than less_than
+
+    block_size=n yields blocks of n values instead, see number_blocks
+    '''
+
+    if block_size:
+        return number_blocks(_multiples_of_n_less_than(n, less_than), block_size, as_numpy)
+    return _multiples_of_n_less_than(n, less_than)
+
+
+def _multiples_of_n_less_than(n, less_than):
     m = n
     while m < less_than:
         yield m
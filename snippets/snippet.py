@@ -1,5 +1,7 @@
 __author__ = 'cole'
 
+one_zero_minus_one = lambda n: (n > 0) - (n < 0)  # the sign of n
+
 median_lambda = lambda l: l[len(l) // 2] if (len(l) & 1) else sum(l[(len(l) // 2 - 1):][:2]) / 2.0
 
 
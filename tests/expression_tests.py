@@ -0,0 +1,52 @@
+__author__ = 'cole'
+
+import unittest
+
+
+class TestExpression(unittest.TestCase):
+    def test_scalar(self):
+        from snippets.expression import Expression
+
+        expression = Expression("(lambda x, y: x * 2 if y else x)")
+        self.assertEqual(expression.arguments, ('x', 'y'))
+        self.assertEqual(expression(21, True), 42)
+        self.assertEqual(expression(21, False), 21)
+
+        expression = Expression("(lambda a, b, c: min(a, b, c) + max([a, b]) + sum((a, b, c)) + abs(-a) ** 2 // 1 % 7)")
+        self.assertEqual(expression(1, 2, 3), 10)
+
+        expression = Expression("(lambda s: 0 < s <= 10 and not s == 5 or s == 100)")
+        self.assertEqual([expression(s) for s in (0, 3, 5, 10, 11, 100)], [False, True, False, True, False, True])
+
+        self.assertEqual(Expression("(lambda *args: sum(args) / 2.0)")(1, 2, 3), 3.0)
+        self.assertEqual(Expression("(lambda _: None if False else True)")(0), True)
+
+    def test_columns(self):
+        import numpy as np
+        from snippets.expression import Expression
+
+        expression = Expression("(lambda x, y: x * 2 if y else x)")
+        self.assertEqual(expression.evaluate_columns([1, 2, 3], [True, False, True]).tolist(), [2, 2, 6])
+
+        expression = Expression("(lambda a, b, c: min(a, b, c) + max([a, b]) + sum([a, b, c]) + abs(-a))")
+        self.assertEqual(expression.evaluate_columns([1, 4], [2, 1], [3, 3]).tolist(), [10, 17])
+
+        expression = Expression("(lambda s: 0 < s <= 10 and not s == 5 or s == 100)")
+        self.assertEqual(expression.evaluate_columns(np.array([0, 3, 5, 10, 11, 100])).tolist(),
+                         [False, True, False, True, False, True])
+
+        # scalars broadcast against the columns, and constants fill them
+        self.assertEqual(Expression("(lambda x, rate: x * rate)").evaluate_columns([1, 2], 3).tolist(), [3, 6])
+        self.assertEqual(Expression("(lambda _: 3)").evaluate_columns(np.arange(4)).tolist(), [3, 3, 3, 3])
+
+    def test_rejected(self):
+        from snippets.expression import Expression, ExpressionError
+
+        for source in (
+            "(lambda x: x.__class__)", "(lambda x: __import__('os'))", "3 + 4", "(lambda x: [y for y in x])",
+            "(lambda x: x[0])", "(lambda x=1: x)", "(lambda **kw: 1)", "(lambda x: open('f'))", "(lambda x: lambda: x)",
+            "(lambda x: ", "(lambda min: min(1))", "(lambda x: y)", "(lambda x: min(x, key=abs))", "(lambda x: {})",
+        ):
+            self.assertRaises(ExpressionError, Expression, source)
+
+        self.assertTrue(issubclass(ExpressionError, ValueError))
@@ -1,5 +1,6 @@
 __author__ = 'cole'
 
+import itertools
 import unittest
 
 class TestGeneratorLength(unittest.TestCase):
@@ -20,6 +21,162 @@ class TestIsPrime(unittest.TestCase):
             [False, False, True, True, False, True, False, True, False, False, False, True]
         )
 
+    def test_is_prime_large(self):
+        from snippets import is_prime
+
+        self.assertTrue(is_prime(4294967291))
+        self.assertTrue(is_prime(2 ** 61 - 1))
+        self.assertTrue(is_prime(2 ** 64 - 59))
+        self.assertTrue(is_prime(2 ** 127 - 1))
+
+        # strong pseudoprimes to the smallest prime bases
+        self.assertFalse(is_prime(3215031751))
+        self.assertFalse(is_prime(3825123056546413051))
+        self.assertFalse(is_prime(318665857834031151167461))
+        self.assertFalse(is_prime(1000000007 * 1000000009))
+
+    def test_is_prime_many(self):
+        import numpy as np
+        from snippets import is_prime, is_prime_many
+
+        numbers = range(-3, 5000) + range(2 ** 20 - 100, 2 ** 20 + 5000) + [4294967291, 3215031751, 2 ** 61 - 1]
+        self.assertEqual(is_prime_many(numbers).tolist(), [is_prime(n) for n in numbers])
+        self.assertEqual(is_prime_many(np.array([[2, 4], [9, 11]])).tolist(), [[True, False], [False, True]])
+
+        numbers = [2 ** 64 - 59, 2 ** 64 - 57, 2 ** 63 + 29, 2 ** 63, 4294967291, 7]
+        self.assertEqual(is_prime_many(np.array(numbers, dtype=np.uint64)).tolist(), [is_prime(n) for n in numbers])
+        self.assertEqual(is_prime_many(np.array(numbers, dtype=np.uint64))[0], True)
+
+
+class TestFactorize(unittest.TestCase):
+    def test_factorize(self):
+        from snippets import factorize
+
+        self.assertEqual(factorize(1), [])
+        self.assertEqual(factorize(2), [(2, 1)])
+        self.assertEqual(factorize(360), [(2, 3), (3, 2), (5, 1)])
+        self.assertEqual(factorize(2 ** 62), [(2, 62)])
+
+        for n in xrange(1, 2000):
+            self.assertEqual(reduce(lambda x, y: x * y, [p ** k for p, k in factorize(n)], 1), n)
+
+    def test_factorize_large(self):
+        from snippets import factorize
+
+        self.assertEqual(factorize(1000000007 * 1000000009), [(1000000007, 1), (1000000009, 1)])
+        self.assertEqual(factorize(2 ** 64 - 59), [(2 ** 64 - 59, 1)])
+        self.assertEqual(factorize(3 * (2 ** 61 - 1) ** 2), [(3, 1), (2 ** 61 - 1, 2)])
+        self.assertEqual(factorize(4294967291 ** 2 * 4294967279), [(4294967279, 1), (4294967291, 2)])
+
+
+class TestSmallestPrimeFactorTable(unittest.TestCase):
+    def test_factorize(self):
+        from snippets import SmallestPrimeFactorTable, factorize
+
+        spf_table = SmallestPrimeFactorTable(10000)
+        self.assertEqual(spf_table.spf[:10].tolist(), [0, 0, 2, 3, 2, 5, 2, 7, 2, 3])
+
+        for n in xrange(1, 10001):
+            self.assertEqual(spf_table.factorize(n), factorize(n))
+
+    def test_factorize_range(self):
+        from snippets import SmallestPrimeFactorTable, factorize
+
+        spf_table = SmallestPrimeFactorTable(10000)
+        offsets, primes, powers = spf_table.factorize_range(0, 10001)
+
+        for n in xrange(10001):
+            i, j = offsets[n], offsets[n + 1]
+            self.assertEqual(zip(primes[i:j].tolist(), powers[i:j].tolist()), factorize(n))
+
+    def test_memory_mapped(self):
+        import os
+        import shutil
+        import tempfile
+
+        import numpy as np
+        from snippets import SmallestPrimeFactorTable
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'spf.npy')
+            spf_table = SmallestPrimeFactorTable(1000, path)
+            self.assertIsInstance(spf_table.spf, np.memmap)
+            self.assertEqual(SmallestPrimeFactorTable(500, path).limit, 1000)
+            self.assertEqual(SmallestPrimeFactorTable(2000, path).limit, 2000)
+            self.assertEqual(SmallestPrimeFactorTable(1500, path).factorize(1998), [(2, 1), (3, 3), (37, 1)])
+
+            path = os.path.join(directory, 'spf')
+            self.assertEqual(SmallestPrimeFactorTable(1000, path).factorize(999), [(3, 3), (37, 1)])
+            self.assertEqual(os.listdir(directory).count('spf'), 1)
+            self.assertIsInstance(SmallestPrimeFactorTable(1000, path).spf, np.memmap)
+
+            with open(path, 'wb') as f:
+                f.write('not an array')
+            self.assertEqual(SmallestPrimeFactorTable(1000, path).factorize(999), [(3, 3), (37, 1)])
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestPrimeCache(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from snippets import use_prime_cache
+
+        self.directory = tempfile.mkdtemp()
+        self.cache = use_prime_cache(self.directory)
+
+    def tearDown(self):
+        import shutil
+        from snippets import use_prime_cache
+
+        use_prime_cache(None)
+        shutil.rmtree(self.directory)
+
+    def test_extended_on_demand(self):
+        import numpy as np
+        from snippets import PrimeCache
+
+        self.assertEqual(self.cache.primes(30).tolist(), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+        self.assertIsInstance(self.cache.primes(), np.memmap)
+        self.assertEqual(self.cache.primes_limit(), 30)
+
+        # a table is at least doubled, and other caches on the directory see the larger table
+        self.assertEqual(self.cache.primes(40).tolist()[-1], 37)
+        self.assertEqual(self.cache.primes().tolist()[-1], 59)
+        self.assertEqual(PrimeCache(self.directory).primes_limit(), 60)
+        self.assertEqual(self.cache.spf_table(1000).factorize(998), [(2, 1), (499, 1)])
+
+    def test_consulted_first(self):
+        from snippets import PrimeCache, factorize, is_prime, prime_generator, use_prime_cache
+
+        use_prime_cache(None)
+        primes, counted = list(prime_generator(limit=50000)), list(prime_generator(count=1000))
+        use_prime_cache(self.directory)
+
+        self.assertEqual(list(prime_generator(limit=50000)), primes)
+        self.assertEqual(list(prime_generator(count=1000)), counted)
+        self.assertEqual(self.cache.primes_limit(), 49999)
+
+        self.cache.spf_table(1 << 21)
+        self.assertEqual(PrimeCache(self.directory).factorize(2 * 9 * 99991), [(2, 1), (3, 2), (99991, 1)])
+        self.assertEqual(factorize(2 * 9 * 99991), [(2, 1), (3, 2), (99991, 1)])
+        self.assertTrue(is_prime(2097143))
+        self.assertFalse(is_prime(2097145))
+        self.assertIsNone(self.cache.is_prime(1 << 30))
+
+    def test_other_version_rebuilt(self):
+        import os
+        from snippets import PrimeCache
+
+        self.cache.spf_table(1000)
+        with open(os.path.join(self.directory, 'spf.v1.bin'), 'r+b') as f:
+            f.write('XXXX')
+
+        cache = PrimeCache(self.directory)
+        self.assertIsNone(cache.factorize(100))
+        self.assertEqual(cache.spf_table(100).factorize(100), [(2, 2), (5, 2)])
+
 
 class TestNumberOfDivisors(unittest.TestCase):
     def test_number_of_divisors(self):
@@ -36,6 +193,25 @@ class TestDivisorsOfN(unittest.TestCase):
     def test_divisors_of_n(self):
         assert True
 
+    def test_divisors_in_order(self):
+        from snippets import divisors_of_n, divisors_in_order
+
+        for n in xrange(1, 1000):
+            self.assertEqual(list(divisors_in_order(n)), divisors_of_n(n))
+        self.assertEqual(list(itertools.islice(divisors_in_order(2 ** 40 * 3 ** 40), 5)), [1, 2, 3, 4, 6])
+
+    def test_divisor_count_and_sum(self):
+        from snippets import divisor_count_and_sum, divisor_counts_and_sums, divisors_of_n
+
+        for n in xrange(1, 1000):
+            divisors = divisors_of_n(n)
+            self.assertEqual(divisor_count_and_sum(n), (len(divisors), sum(divisors)))
+        self.assertEqual(divisor_count_and_sum(2 ** 70), (71, 2 ** 71 - 1))
+
+        self.assertEqual(divisor_counts_and_sums([1, 12, 28, 1000000007]), [(1, 1), (6, 28), (6, 56), (2, 1000000008)])
+        self.assertEqual(divisor_counts_and_sums(xrange(1, 5)), [(1, 1), (2, 3), (2, 4), (3, 7)])
+        self.assertEqual(divisor_counts_and_sums([]), [])
+
     def test_divisors_of_n_less_than(self):
         from snippets import divisors_of_n, divisors_for_n_less_than
 
@@ -43,3 +219,38 @@ class TestDivisorsOfN(unittest.TestCase):
 
         for i, d_list in enumerate(divisor_lists):
             self.assertEqual(set(d_list), set(divisors_of_n(i+1)))
+
+    def test_divisors_of_n_less_than_csr(self):
+        from snippets import divisors_for_n_less_than
+
+        divisor_lists = divisors_for_n_less_than(13)
+        self.assertEqual(len(divisor_lists), 12)
+        self.assertEqual(divisor_lists[11], [1, 2, 3, 4, 6, 12])
+        self.assertEqual(divisor_lists[-1], divisor_lists[11])
+        self.assertEqual(divisor_lists.offsets.tolist(), [0, 1, 3, 5, 8, 10, 14, 16, 20, 23, 27, 29, 35])
+        self.assertEqual(divisor_lists.counts().tolist(), [1, 2, 2, 3, 2, 4, 2, 4, 3, 4, 2, 6])
+        self.assertEqual(list(divisors_for_n_less_than(1)), [])
+
+
+class TestMultiplicativeFunctions(unittest.TestCase):
+    def test_multiplicative_functions(self):
+        from fractions import gcd
+        from snippets import divisors_of_n, factorize, multiplicative_functions
+
+        functions = multiplicative_functions(500)
+        for n in xrange(1, 500):
+            divisors = divisors_of_n(n)
+            self.assertEqual(functions['divisor_count'][n], len(divisors))
+            self.assertEqual(functions['divisor_sum'][n], sum(divisors))
+            self.assertEqual(functions['totient'][n], sum(1 for k in xrange(1, n + 1) if gcd(k, n) == 1))
+
+            factors = factorize(n)
+            mobius = 0 if any(k > 1 for p, k in factors) else (-1) ** len(factors)
+            self.assertEqual(functions['mobius'][n], mobius)
+
+    def test_small_limits(self):
+        from snippets import multiplicative_functions
+
+        self.assertEqual(multiplicative_functions(0)['totient'].tolist(), [])
+        self.assertEqual(multiplicative_functions(2)['divisor_sum'].tolist(), [0, 1])
+        self.assertEqual(multiplicative_functions(3)['mobius'].tolist(), [0, 1, -1])
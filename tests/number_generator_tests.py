@@ -43,6 +43,32 @@ class TestGenerators(unittest.TestCase):
         gl = generator_limiter(gen, limit=100, last_only=True, as_tuple=3)
         self.assertEqual(list(gl), [(13, 21, 34)])
 
+    def test_generator_limiter_pipeline(self):
+        from snippets import generator_limiter
+        from snippets.number_generators import _fibonacci_generator
+
+        arguments = [
+            dict(count=20), dict(count=20, last_only=True), dict(limit=21, as_tuple=2),
+            dict(limit=21, last_only=True, as_tuple=2), dict(limit=21, count=4, as_tuple=2),
+            dict(limit=21, count=4, last_only=True, as_tuple=2),
+            dict(limit=(lambda x: x < 30), filter_by=(lambda x: x & 1)),
+            dict(limit=1, last_only=True, as_tuple=3), dict(limit=0, last_only=True),
+            dict(count=5, filter_by=(lambda x: x % 3 == 0), last_only=True),
+        ]
+        for kwargs in arguments:
+            self.assertEqual(list(generator_limiter(pipeline=True, **kwargs)), list(generator_limiter(**kwargs)))
+
+        gl = generator_limiter(_fibonacci_generator(), limit=100, as_tuple=3, pipeline=True)
+        self.assertEqual(list(gl), [(1, 1, 2), (3, 5, 8), (13, 21, 34)])
+
+        gl = generator_limiter(iter([0, 0, 5]), count=3, last_only=True, pipeline=True)
+        self.assertEqual(list(gl), [5])
+
+        # limit=0 is a limit, and last_only yields nothing when the first value is already beyond it
+        self.assertEqual(list(generator_limiter(limit=0, last_only=True, pipeline=True)), [])
+        self.assertEqual(list(generator_limiter(limit=0, last_only=True)), [])
+        self.assertEqual(list(generator_limiter(limit=0, count=3)), [])
+
     def test_counter(self):
         from snippets import count_generator
 
@@ -98,6 +124,27 @@ class TestGenerators(unittest.TestCase):
         fib_numbers = fibonacci_generator(as_tuple=True, limit=(lambda x: x < 55))
         self.assertEqual(list(fib_numbers), [(1, 1, 2), (3, 5, 8), (13, 21, 34)])
 
+        # test last_only with a numeric limit, which jumps straight to the answer
+        self.assertEqual(list(fibonacci_generator(limit=100, last_only=True)), [89])
+        self.assertEqual(list(fibonacci_generator(limit=89, last_only=True)), [55])
+        self.assertEqual(list(fibonacci_generator(limit=1, last_only=True)), [])
+
+    def test_fibonacci(self):
+        from snippets import fibonacci, fibonacci_mod, fibonacci_index_below
+        from snippets.number_generators import _fibonacci_generator
+
+        fibs = [0] + list(itertools.islice(_fibonacci_generator(), 300))
+        for n, f in enumerate(fibs):
+            self.assertEqual(fibonacci(n), f)
+            self.assertEqual(fibonacci_mod(n, 1000), f % 1000)
+
+        for limit in itertools.chain(xrange(1, 1000), fibs[3:-1], (f + 1 for f in fibs[3:-1])):
+            k = fibonacci_index_below(limit)
+            self.assertTrue(fibs[k] < limit <= fibs[k + 1])
+
+        self.assertEqual(fibonacci_mod(10 ** 18, 10 ** 9 + 7), 209783453)
+        self.assertEqual(fibonacci_index_below(fibonacci(100000)), 99999)
+
     def test_simple_fibonacci_generator(self):
         from snippets.number_generators import _fibonacci_generator, fibonacci_generator
 
@@ -145,6 +192,33 @@ class TestGenerators(unittest.TestCase):
         primes = prime_generator(limit=60)
         self.assertEqual(list(primes), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59])
 
+        primes = prime_generator(limit=60, last_only=True)
+        self.assertEqual(list(primes), [59])
+
+        self.assertEqual(list(prime_generator(limit=60.5)), list(prime_generator(limit=60)))
+        self.assertEqual(list(prime_generator(limit=2e4, last_only=True)), [19997])
+
+    def test_primes_in_range(self):
+        from snippets import primes_in_range, prime_segments
+        from snippets.number_generators import _prime_generator
+
+        primes = list(itertools.takewhile(lambda p: p < 100000, _prime_generator()))
+
+        self.assertEqual(list(primes_in_range(2, 100000)), primes)
+        self.assertEqual(list(primes_in_range(2, 100000, segment_size=100)), primes)
+        self.assertEqual(list(primes_in_range(0, 30)), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29])
+        self.assertEqual(list(primes_in_range(9, 30)), [11, 13, 17, 19, 23, 29])
+        self.assertEqual(list(primes_in_range(89, 98)), [89, 97])
+        self.assertEqual(list(primes_in_range(30, 30)), [])
+        self.assertEqual(list(itertools.islice(primes_in_range(50000), 3)), [50021, 50023, 50033])
+
+        segments = list(prime_segments(2, 100000, segment_size=1000))
+        self.assertTrue(all(len(segment) <= 1000 for segment in segments))
+        self.assertEqual(sum(len(segment) for segment in segments), len(primes))
+
+        self.assertEqual(list(primes_in_range(50000, 100000, segment_size=1000, processes=2)),
+                         [p for p in primes if p >= 50000])
+
     def test_prime_factor_generator(self):
         from snippets import prime_factor_generator
 
@@ -229,4 +303,36 @@ class TestGenerators(unittest.TestCase):
 
         multiples_of_n = multiples_of_n_less_than(3, 200)
 
-        self.assertEqual(list(multiples_of_n), [3, 9, 27, 81])
\ No newline at end of file
+        self.assertEqual(list(multiples_of_n), [3, 9, 27, 81])
+    def test_block_output(self):
+        from array import array
+        import numpy as np
+        from snippets import (count_generator, multiples_of_n_less_than, number_blocks, palindromic_number_generator,
+                              prime_generator, triangle_number_generator)
+
+        blocks = list(count_generator(10, block_size=4))
+        self.assertTrue(all(isinstance(block, array) for block in blocks))
+        self.assertEqual([list(block) for block in blocks], [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+
+        blocks = list(count_generator(10, block_size=4, as_numpy=True))
+        self.assertEqual([block.dtype for block in blocks], [np.int64] * 3)
+
+        primes = list(prime_generator(count=1234))
+        blocks = list(prime_generator(count=1234, block_size=100))
+        self.assertEqual([len(block) for block in blocks], [100] * 12 + [34])
+        self.assertEqual([p for block in blocks for p in block], primes)
+        self.assertEqual(np.concatenate(list(prime_generator(limit=1000, block_size=64, as_numpy=True))).tolist(),
+                         list(prime_generator(limit=1000)))
+
+        triangles = list(itertools.islice(triangle_number_generator(), 30))
+        blocks = itertools.islice(triangle_number_generator(block_size=7, as_numpy=True), 5)
+        self.assertEqual(np.concatenate(list(blocks))[:30].tolist(), triangles)
+
+        self.assertEqual([list(block) for block in palindromic_number_generator(12, block_size=5)],
+                         [[11, 22, 33, 44, 55], [66, 77, 88, 99, 1001], [1111]])
+
+        # values beyond 64 bits fall back to a block of python ints
+        blocks = list(multiples_of_n_less_than(2 ** 20, 2 ** 100, block_size=2))
+        self.assertEqual([type(block) for block in blocks], [array, list])
+        self.assertEqual([m for block in blocks for m in block], [2 ** 20, 2 ** 40, 2 ** 60, 2 ** 80])
+        self.assertEqual(list(number_blocks([2 ** 70], as_numpy=True))[0].dtype, object)
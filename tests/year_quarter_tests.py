@@ -1,9 +1,12 @@
 __author__ = 'cole'
 
+import datetime
 import unittest
 
-from year_quarter import dif_yq, incr_yq, count_yq
-from year_quarter import YearQtr
+import numpy as np
+
+from year_quarter import dif_yq, incr_yq, count_yq, mon_year_to_yq, parse_yq, format_yq, YearQtrParseError
+from year_quarter import QuarterRange, QuarterSeries, TimeFrameMixin, YearQtr, YearQtrArray
 
 
 class YearQtrTestCase(unittest.TestCase):
@@ -25,6 +28,36 @@ class YearQtrTestCase(unittest.TestCase):
         self.assertEqual(incr_yq(20141, 0), 20141)
         self.assertEqual(incr_yq(20146, 0), 20152)
 
+    def test_mon_year_to_yq(self):
+        self.assertEqual(mon_year_to_yq(1, 2014), 20141)
+        self.assertEqual(mon_year_to_yq(3, 2014), 20141)
+        self.assertEqual(mon_year_to_yq(4, 2014), 20142)
+        self.assertEqual(mon_year_to_yq(12, 2014), 20144)
+
+    def test_parse_yq(self):
+        codes = parse_yq(['2014Q1', '2014-Q2', '1Q14', '3q2015', '2014-03-31', '20143', 20144,
+                          datetime.date(2014, 6, 30), 'bad', '2014-13-01', None])
+        self.assertEqual(codes.tolist(), [20141, 20142, 20141, 20153, 20141, 20143, 20144, 20142, 0, 0, 0])
+
+        self.assertEqual(parse_yq(np.array(['2014Q1', '4Q13', '?'])).tolist(), [20141, 20134, 0])
+        self.assertEqual(parse_yq(['1Q99', '2Q69', '3Q68', '4Q00']).tolist(), [19991, 19692, 20683, 20004])
+        self.assertEqual(parse_yq(np.array(['2014-03-31', '2014-10-01', 'NaT'], dtype='M8[D]')).tolist(),
+                         [20141, 20144, 0])
+        self.assertEqual(parse_yq(np.array([20141, 20145])).tolist(), [20141, 0])
+
+        try:
+            parse_yq(['2014Q1', '2014Q5', '2014Q2', ''], strict=True)
+            assert False
+
+        except YearQtrParseError as e:
+            self.assertEqual(e.indices, [1, 3])
+
+    def test_format_yq(self):
+        self.assertEqual(format_yq([20141, 20144, 20141]), ['2014Q1', '2014Q4', '2014Q1'])
+        self.assertEqual(format_yq(np.array([20134]), '{qtr}Q{yy:02d}'), ['4Q13'])
+        self.assertEqual(format_yq([20142], '{year}-{month:02d}-{day:02d}'), ['2014-06-30'])
+        self.assertEqual(parse_yq(format_yq([20141, 20152])).tolist(), [20141, 20152])
+
     def test_dif_yq(self):
         self.assertEqual(dif_yq(20144, 20143), 1)
         self.assertEqual(dif_yq(20151, 20144), 1)
@@ -55,6 +88,48 @@ class YearQtrTestCase(unittest.TestCase):
         yqg = count_yq(20141, 3, -1)
         self.assertEqual(list(yqg), [20141, 20134, 20133])
 
+        yqg = count_yq(20141, 20152, include=False)
+        self.assertEqual(list(yqg), [20142, 20143, 20144, 20151])
+
+        yqg = count_yq(20152, 20141, include=False)
+        self.assertEqual(list(yqg), [20151, 20144, 20143, 20142])
+
+        yqg = count_yq(20141, 20152)
+        self.assertIsInstance(yqg, QuarterRange)
+        self.assertEqual(len(yqg), 5)
+        self.assertIn(20144, yqg)
+        self.assertNotIn(20152, yqg)
+
+    def test_quarter_range(self):
+        qr = QuarterRange(20141, 20152)
+        self.assertEqual(list(qr), [20141, 20142, 20143, 20144, 20151])
+        self.assertEqual((qr.start, qr.stop, qr.step), (20141, 20152, 1))
+        self.assertEqual(len(QuarterRange(20152, 20141)), 0)
+        self.assertEqual(len(QuarterRange(20141, 20141)), 0)
+
+        qr = QuarterRange(20152, 20141, -2)
+        self.assertEqual(list(qr), [20152, 20144, 20142])
+        self.assertEqual(len(qr), 3)
+        self.assertEqual(list(reversed(qr)), [20142, 20144, 20152])
+
+        self.assertIn(20144, qr)
+        self.assertIn(YearQtr(20144), qr)
+        self.assertNotIn(20143, qr)
+        self.assertNotIn(20134, qr)
+        self.assertNotIn('20144', qr)
+
+        self.assertEqual(qr[0], 20152)
+        self.assertEqual(qr[-1], 20142)
+        self.assertRaises(IndexError, lambda: qr[3])
+        self.assertEqual(qr.index(20142), 2)
+        self.assertRaises(ValueError, qr.index, 20143)
+        self.assertEqual(qr.count(20144), 1)
+
+        self.assertEqual(list(qr[1:]), [20144, 20142])
+        self.assertEqual(list(qr[::-1]), [20142, 20144, 20152])
+        self.assertEqual(QuarterRange(20141, 20152)[::2], QuarterRange(20141, 20152, 2))
+        self.assertEqual(QuarterRange(20141, 20142), QuarterRange(20141, 20142, 3))
+
 
 class YearQuarterTestCase(unittest.TestCase):
     def test_yq(self):
@@ -64,4 +139,197 @@ class YearQuarterTestCase(unittest.TestCase):
         self.assertEqual(yq.qtr, 1)
         self.assertEqual(YearQtr(20145).yq, 20151)
         self.assertEqual(yq.incr(10), incr_yq(20141, 10))
-        self.assertEqual(yq.dif(20152), dif_yq(20141, 20152))
\ No newline at end of file
+        self.assertEqual(yq.dif(20152), dif_yq(20141, 20152))
+
+    def test_yq_quarter_codes(self):
+        yq = YearQtr(20141)
+        self.assertEqual(list(yq.quarter_codes(20143)), [20141, 20142, 20143])
+        self.assertEqual(list(yq.quarter_codes(20133)), [20133, 20134, 20141])
+        self.assertEqual(list(yq.quarter_codes(0)), [20141])
+        self.assertEqual(list(yq.past_n_quarters(4)), [20141, 20134, 20133, 20132])
+        self.assertEqual(list(yq.prior_n_quarters(4)), [20134, 20133, 20132, 20131])
+
+    def test_yq_value_type(self):
+        import pickle
+
+        yq = YearQtr(20141)
+        self.assertIs(yq, YearQtr(20141))
+        self.assertIs(yq, YearQtr(yq))
+        self.assertIs(YearQtr(20145), YearQtr(20151))
+        self.assertEqual(yq.ordinal, 2014 * 4)
+        self.assertFalse(hasattr(yq, '__dict__'))
+
+        self.assertEqual(yq, 20141)
+        self.assertNotEqual(yq, YearQtr(20142))
+        self.assertNotEqual(YearQtr(20151), 20145)
+        self.assertFalse(YearQtr(20151) == 20145)
+        self.assertNotIn(20145, {YearQtr(20151): 1})
+        self.assertTrue(YearQtr(20134) < yq <= 20141 < YearQtr(20142))
+        self.assertEqual(sorted([YearQtr(20151), yq, YearQtr(20134)]), [20134, 20141, 20151])
+        self.assertEqual({yq: 1}[20141], 1)
+        self.assertEqual({20141: 1}[yq], 1)
+        self.assertIs(pickle.loads(pickle.dumps(yq)), yq)
+
+
+class YearQtrArrayTestCase(unittest.TestCase):
+    def test_yq_array(self):
+        yqa = YearQtrArray([20141, 20144, 20145, 20134])
+        self.assertEqual(yqa.tolist(), [20141, 20144, 20151, 20134])
+        self.assertEqual(yqa.year.tolist(), [2014, 2014, 2015, 2013])
+        self.assertEqual(yqa.qtr.tolist(), [1, 4, 1, 4])
+        self.assertEqual(len(yqa), 4)
+        self.assertEqual(yqa[1], 20144)
+        self.assertEqual(yqa[1:].tolist(), [20144, 20151, 20134])
+
+    def test_yq_array_incr(self):
+        codes = [20141, 20144, 20142, 20143, 20131]
+        for n in (0, 1, 4, 9, -1, -7):
+            self.assertEqual(YearQtrArray(codes).incr(n).tolist(), [incr_yq(yq, n) for yq in codes])
+            self.assertEqual(YearQtrArray(codes).incr(n, -1).tolist(), [incr_yq(yq, n, -1) for yq in codes])
+
+        self.assertEqual(YearQtrArray(codes).incr(range(5)).tolist(), [incr_yq(yq, n) for n, yq in enumerate(codes)])
+
+    def test_yq_array_dif(self):
+        codes = [20144, 20151, 20143, 20144]
+        self.assertEqual(YearQtrArray(codes).dif(20143).tolist(), [dif_yq(yq, 20143) for yq in codes])
+        self.assertEqual(YearQtrArray(codes).dif(YearQtr(20151)).tolist(), [dif_yq(yq, 20151) for yq in codes])
+
+        others = [20143, 20144, 20144, 20151]
+        self.assertEqual(YearQtrArray(codes).dif(YearQtrArray(others)).tolist(),
+                         [dif_yq(yq1, yq2) for yq1, yq2 in zip(codes, others)])
+
+    def test_yq_array_count(self):
+        yqa = YearQtrArray([20141, 20143])
+        self.assertEqual(yqa.count(3).tolist(), [[20141, 20142, 20143], [20143, 20144, 20151]])
+        self.assertEqual(yqa.count(-3).tolist(), [[20133, 20134, 20141], [20141, 20142, 20143]])
+
+    def test_yq_array_compare(self):
+        yqa = YearQtrArray([20134, 20141, 20142])
+        self.assertEqual((yqa == 20141).tolist(), [False, True, False])
+        self.assertEqual((yqa < 20141).tolist(), [True, False, False])
+        self.assertEqual((yqa >= YearQtr(20141)).tolist(), [False, True, True])
+        self.assertEqual((yqa != YearQtrArray([20134, 20142, 20142])).tolist(), [False, True, False])
+
+
+class QuarterSeriesTestCase(unittest.TestCase):
+    def test_quarter_series(self):
+        qs = QuarterSeries(20141, range(8))
+        self.assertEqual(len(qs), 8)
+        self.assertEqual((qs.start_code, qs.end_code), (20141, 20154))
+        self.assertEqual(qs[20141], 0)
+        self.assertEqual(qs[YearQtr(20152)], 5)
+        self.assertIn(20154, qs)
+        self.assertNotIn(20161, qs)
+        self.assertRaises(KeyError, lambda: qs[20134])
+        self.assertEqual(qs.get(20161, -1), -1)
+        self.assertEqual(qs.to_dict()[20143], 2)
+
+    def test_quarter_series_from_dict(self):
+        qs = QuarterSeries.from_dict({20143: 1.0, 20141: 2.0, 20151: 3.0}, fill=0)
+        self.assertEqual(qs.base, 20141)
+        self.assertEqual(qs.values.tolist(), [2.0, 0, 1.0, 0, 3.0])
+
+    def test_quarter_series_windows(self):
+        qs = QuarterSeries(20141, range(8))
+
+        window = qs[20142:20151]
+        self.assertEqual((window.base, window.values.tolist()), (20142, [1, 2, 3]))
+        self.assertTrue(window.values.base is qs.values)
+
+        window = qs.window(20152, 20164)
+        self.assertEqual((window.base, window.values.tolist()), (20152, [5, 6, 7]))
+        self.assertEqual(len(qs.window(20161, 20164)), 0)
+
+        tf = TimeFrame()
+        tf.set_time_frame(20141, 8)
+        window = qs.time_frame(tf, 'four_quarter_lookback')
+        self.assertEqual((window.base, window.values.tolist()), (20151, [4, 5, 6, 7]))
+        self.assertEqual(qs.time_frame(tf, 'five_year_lookback').values.tolist(), range(8))
+
+    def test_quarter_series_rolling(self):
+        qs = QuarterSeries(20141, range(8))
+
+        rolling = qs.rolling_sum(4)
+        self.assertEqual(rolling.base, 20144)
+        self.assertEqual(rolling.values.tolist(), [6, 10, 14, 18, 22])
+        self.assertEqual(qs.rolling_mean(4).values.tolist(), [1.5, 2.5, 3.5, 4.5, 5.5])
+        self.assertEqual(qs.rolling_sum(1).values.tolist(), range(8))
+        self.assertEqual(len(qs.rolling_sum(9)), 0)
+
+        gaps = QuarterSeries.from_dict({20141: 1, 20143: 1, 20144: 1, 20151: 1}).rolling_sum(2)
+        self.assertEqual(gaps.base, 20142)
+        self.assertTrue(np.isnan(gaps.values[:2]).all())
+        self.assertEqual(gaps.values[2:].tolist(), [2, 2])
+
+        self.assertEqual(QuarterSeries(20141, [1e17, 1, 1, 1]).rolling_sum(2).values.tolist()[1:], [2, 2])
+
+
+class TimeFrame(TimeFrameMixin):
+    pass
+
+
+class TimeFrameMixinTestCase(unittest.TestCase):
+    def test_time_frame(self):
+        tf = TimeFrame()
+        tf.set_time_frame(20121, 20144)
+        self.assertEqual(tf.time_frame, (20121, 20144))
+        self.assertEqual(tf.current_quarter_code, 20144)
+        self.assertEqual(tf.number_of_quarters, 12)
+
+        tf.set_time_frame(20141, 4)
+        self.assertEqual(tf.time_frame, (20141, 20144))
+
+        tf.set_time_frame(20144, -4)
+        self.assertEqual(tf.time_frame, (20141, 20144))
+
+    def test_time_frame_dict(self):
+        tf = TimeFrame()
+        tf.set_time_frame(20121, 20144, current_quarter=20143)
+        dct = tf.time_frame_dict
+
+        self.assertEqual(dct['ends'], (20121, 20144))
+        self.assertEqual(dct['current'], (20143, ))
+        self.assertEqual(dct['four_quarter_lookback'], (20134, 20144))
+        self.assertEqual(dct['three_year_lookback'], None)
+        self.assertEqual(list(dct['all']), list(tf.time_frame_quarter_codes))
+        self.assertEqual(dct[20132], (20132, ))
+        self.assertIn(20132, dct)
+        self.assertNotIn(20151, dct)
+        self.assertRaises(KeyError, lambda: dct[20151])
+
+        self.assertIs(tf.time_frame_dict, dct)
+        tf.set_current_quarter_code(20144)
+        self.assertIsNot(tf.time_frame_dict, dct)
+        self.assertEqual(tf.time_frame_dict['current'], (20144, ))
+
+        dct = tf.time_frame_dict
+        tf.set_time_frame(20121, 20151)
+        self.assertIsNot(tf.time_frame_dict, dct)
+        self.assertEqual(tf.time_frame_dict[20151], (20151, ))
+
+    def test_look_back_or_last(self):
+        tf = TimeFrame()
+        tf.set_time_frame(20121, 20144)
+        self.assertEqual(tf.look_back_or_last(), (20141, 20144))
+        self.assertEqual(tf.look_back_or_last('three_year_lookback'), (20121, 20144))
+        self.assertEqual(tf.look_back_or_last('five_year_lookback'), (20121, 20144))
+        self.assertEqual(tf.get_first_last('ends'), (20121, 20144))
+        self.assertEqual(tf.get_first_last((20131, 20134)), (20131, 20134))
+
+    def test_time_frame_columns(self):
+        frames = [(20121, 20144), (20121, 20144, 20132), (20141, 4), (20141, 4, 20142),
+                  (20144, -4), (20151, 20101, 20134), (20141, None), (20141, 0, None), (20101, 30)]
+        columns = TimeFrame.time_frame_columns(frames)
+
+        for i, frame in enumerate(frames):
+            tf = TimeFrame()
+            tf.set_time_frame(*frame)
+            for key in tf.time_frame_dict:
+                first, last = columns[key]
+                self.assertEqual((first[i], last[i]), tf.look_back_or_last(key))
+
+        columns = TimeFrame.time_frame_columns([(20141, 4), (20144, -4)], inclusive=False)
+        self.assertEqual(columns['ends'][0].tolist(), [20141, 20134])
+        self.assertEqual(columns['ends'][1].tolist(), [20151, 20144])
+
+        self.assertRaises(AssertionError, TimeFrame.time_frame_columns, [(20141, 4, 20152)])
@@ -1,8 +1,12 @@
 __author__ = 'cole'
 
 import datetime
+import itertools
+import re
 import warnings
 
+import numpy as np  # pip install numpy
+
 from snippets import snippet as snp
 
 
@@ -14,14 +18,16 @@ from snippets import snippet as snp
 
 yq_value = lambda yq: yq.yq if isinstance(yq, YearQtr) else yq
 yq_object = lambda yq: yq if isinstance(yq, YearQtr) else YearQtr(yq)
+yq_ordinal = lambda yq: yq.ordinal if isinstance(yq, YearQtr) else (yq // 10) * 4 + yq % 10 - 1
+ordinal_yq = lambda ordinal: (ordinal // 4) * 10 + ordinal % 4 + 1
 
 def mon_year_to_yq(month, year):
     '''
     mon_year_to_yq takes month and year as arguments
     and returns standard yq_quarter_code form for the given arguments
-    e.g.: month_year_to_yq(2014, 2) = 20141
+    e.g.: mon_year_to_yq(2, 2014) = 20141, mon_year_to_yq(12, 2014) = 20144
     '''
-    return (year * 10) + (month // 3) + 1
+    return (year * 10) + (month - 1) // 3 + 1
 
 
 def today_yq():
@@ -32,6 +38,128 @@ def today_yq():
     return mon_year_to_yq(today.month, today.year)
 
 
+_QUARTER_END_DAYS = {1: (3, 31), 2: (6, 30), 3: (9, 30), 4: (12, 31)}
+
+_yq_string_pattern = re.compile(r'''^\s*(?:
+    (?P<year>\d{4})\s*-?\s*[Qq](?P<qtr>[1-4])        # 2014Q1, 2014-Q1
+  | (?P<q_qtr>[1-4])[Qq](?P<q_year>\d{2}|\d{4})      # 1Q14, 1Q2014
+  | (?P<d_year>\d{4})-(?P<d_month>\d{1,2})-\d{1,2}  # 2014-03-31
+  | (?P<yq>\d{4}[1-4])                               # 20141
+)\s*$''', re.VERBOSE)
+
+
+class YearQtrParseError(ValueError):
+    '''
+    YearQtrParseError is raised by parse_yq(strict=True); self.indices lists
+    the positions of the values which could not be parsed
+    '''
+
+    def __init__(self, indices):
+        self.indices = list(indices)
+        super(YearQtrParseError, self).__init__(
+            "%d invalid quarter values at indices %s" % (len(self.indices), self.indices[:20]))
+
+
+def _parse_one_yq(value):
+    # the yq_quarter_code for a single string, date or YYYYQ value, or 0 if invalid
+    if isinstance(value, datetime.date):
+        return mon_year_to_yq(value.month, value.year)
+
+    if isinstance(value, (int, long, np.integer)):
+        return int(value) if 1 <= value % 10 <= 4 and value > 999 else 0
+
+    if not isinstance(value, basestring):
+        return 0
+
+    match = _yq_string_pattern.match(value)
+    if match is None:
+        return 0
+
+    groups = match.groupdict()
+    if groups['year']:
+        return int(groups['year']) * 10 + int(groups['qtr'])
+    if groups['q_year']:
+        year = int(groups['q_year'])
+        if len(groups['q_year']) == 2:
+            year += 1900 if year >= 69 else 2000  # the pivot of strptime's %y: 69-99 are 1969-1999
+        return year * 10 + int(groups['q_qtr'])
+    if groups['d_year']:
+        month = int(groups['d_month'])
+        return mon_year_to_yq(month, int(groups['d_year'])) if 1 <= month <= 12 else 0
+    return int(groups['yq'])
+
+
+def _unique_objects(values):
+    # (distinct values, inverse indices) for an object array, which np.unique cannot sort when types are mixed
+    positions, distinct = {}, []
+    inverse = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        try:
+            inverse[i] = positions[value]
+        except KeyError:
+            inverse[i] = positions[value] = len(distinct)
+            distinct.append(value)
+    return distinct, inverse
+
+
+def parse_yq(values, strict=False):
+    '''
+    parse_yq converts an iterable or numpy array of period values into a numpy
+    array of yq_quarter_code values, e.g. "2014Q1", "2014-Q1", "1Q14",
+    "2014-03-31", "20141", datetime.date(2014, 3, 31) and 20141 all give 20141
+
+    each distinct value is parsed once, so the cost scales with the number of
+    distinct periods rather than the number of rows; numpy datetime64 and
+    integer arrays are converted without a python loop
+
+    invalid values give 0, or with strict=True a YearQtrParseError
+    which lists the indices of the invalid values
+    '''
+
+    values = values if isinstance(values, np.ndarray) else np.array(list(values), dtype=object)
+
+    if values.dtype.kind == 'M':
+        months = values.astype('M8[M]').astype(np.int64)
+        codes = (months // 12 + 1970) * 10 + (months % 12) // 3 + 1
+        codes[np.isnat(values)] = 0
+
+    elif values.dtype.kind in 'iu':
+        codes = np.where((values > 999) & (values % 10 >= 1) & (values % 10 <= 4), values, 0)
+
+    else:
+        distinct, inverse = _unique_objects(values) if values.dtype.kind == 'O' \
+            else np.unique(values, return_inverse=True)
+        codes = np.array([_parse_one_yq(v) for v in distinct], dtype=np.int64)[inverse]
+
+    codes = codes.astype(np.int64)
+    if strict and not codes.all():
+        raise YearQtrParseError(np.flatnonzero(codes == 0).tolist())
+
+    return codes
+
+
+def format_yq(quarter_codes, template='{year}Q{qtr}'):
+    '''
+    format_yq converts yq_quarter_code values into a list of strings, the reverse of parse_yq
+
+    template is a str.format template given year, yy (the two digit year), qtr,
+    and month and day of the quarter end, e.g.
+        '{year}Q{qtr}' => '2014Q1', '{qtr}Q{yy:02d}' => '1Q14',
+        '{year}-{month:02d}-{day:02d}' => '2014-03-31'
+    '''
+
+    ordinals = yq_ordinal(np.asarray(quarter_codes, dtype=np.int64))
+    distinct, inverse = np.unique(ordinals, return_inverse=True)
+
+    formatted = []
+    for ordinal in distinct.tolist():
+        year, qtr = ordinal // 4, ordinal % 4 + 1
+        month, day = _QUARTER_END_DAYS[qtr]
+        formatted.append(template.format(year=year, yy=year % 100, qtr=qtr, month=month, day=day))
+
+    return [formatted[i] for i in inverse]
+
+
 def incr_yq(yq, n=1, m=1):
     '''
     incr_yq or `increment` yq_quarter_code returns the
@@ -65,22 +193,27 @@ def dif_yq(yq1, yq2):
     when the count argument is
     '''
 
-    yq1, yq2 = yq_object(yq1), yq_object(yq2)
-    return (yq1.year - yq2.year) * 4 + (yq1.qtr - yq2.qtr)
+    return yq_ordinal(yq1) - yq_ordinal(yq2)
 
 
 def count_yq(start, stop=None, step=None, include=True):
     '''
-    count_yq is a generator of sequential yq_quarter_code values
+    count_yq counts sequential yq_quarter_code values
 
-    given just a start value, the counter counts indefinitely
+    given just a start value, the counter counts indefinitely,
+    returning an iterator
 
     given just a start value and a step value, the counter
     yields a value n steps if step > 0 or -n steps if step < 0
 
+    given a stop value, count_yq returns a QuarterRange, so the
+    sequence supports len(), `in`, indexing and slicing without
+    walking the quarter codes
+
     if stop is < 1000, count_yq will count for
     n numbers of quarters, otherwise is will count from
-    start to stop exclusive of the stop yq_quarter_code value
+    start to stop exclusive of the stop yq_quarter_code value,
+    in increments of abs(step)
 
     (start, count > 0, step < 0) will count `count` down
     in increments of step, and counting down from start
@@ -90,53 +223,39 @@ def count_yq(start, stop=None, step=None, include=True):
     # (start, count < 0) will count up to start, so
     # the stop value is the initial start value, and
     # the inferred start value is start-count
-    '''
 
+    include=False excludes the start value, shifting the
+    sequence by one quarter in the direction of the count
+    '''
 
     # (20141, 3, -1) is not the equivalent of (20141, -3)
     # the former counts down and the later counts up
 
-    assert YearQtr(yq_value(start))
+    start = YearQtr(start)
     stop = isinstance(stop, long) and int(stop) or stop
 
     assert stop is None or isinstance(stop, int), "stop must be None or an int"
-    assert step is None or isinstance(step, int), "stop must be None or an int"
-
-    if not isinstance(step, type(None)):
-        assert stop != 0, "Invalid step value of 0"
-
-    count = stop if stop < 1000 else dif_yq(stop, start)  # May still be None
-    if count is not None:
-        count += -1 if stop > 999 and not include else 0  # if stop=YYYYQ and include=False
-
-    # Special cases #
-    # 1. if (start, count, step < 0), then the arguments to `count_generator`
-    #    must be in the form
-    # 2. if (start, count, step=1) will create args of (count, None, 1)
-    #    which will count indefinitely, starting at count, so must be
-    #    passed to count_generator in the form (count, None, None)
+    assert step is None or isinstance(step, int), "step must be None or an int"
+    assert step != 0, "Invalid step value of 0"
 
-    stop_from_count = None
-    if stop is not None and stop > 0 and step is not None and step < 0:
-        count = -count
-        step = None
+    step = step or 1
+    if stop is None:  # count indefinitely
+        first = start.ordinal + (not include) * snp.one_zero_minus_one(step)
+        return itertools.imap(ordinal_yq, itertools.count(first, step))
 
-    if stop is not None and stop < 0 and step is None:
-        count = stop + 1
-        stop_from_count = 1
+    if stop > 999:  # count from start to the stop yq_quarter_code value
+        direction = snp.one_zero_minus_one(dif_yq(stop, start)) or 1
+        first = start.ordinal + (not include) * direction
+        return QuarterRange(ordinal_yq(first), stop, direction * abs(step))
 
-    if stop_from_count is None and step == 1:
-        step = None
+    if stop < 0:  # count up to start, so start is the last value
+        step = abs(step)
+        first = start.ordinal - (not include) - (-stop - 1) * step
+        return QuarterRange.from_ordinals(first, step, -stop)
 
-    directions = [count or stop, stop_from_count, step]
-    direction = reduce(lambda x, y: x * y, [snp.one_zero_minus_one(d) for d in directions if d is not None])
-
-    change_start = 1 * (not include) * direction
-    start = incr_yq(start, change_start)
-
-    counting = snp.count_generator(count, stop_from_count, step)
-    while counting:
-        yield incr_yq(start, counting.next())
+    # 0 <= stop < 1000, so count stop quarters in the direction of step
+    first = start.ordinal + (not include) * snp.one_zero_minus_one(step)
+    return QuarterRange.from_ordinals(first, step, stop)
 
 
 class YearQtr(object):
@@ -144,6 +263,11 @@ class YearQtr(object):
     YearQtr initializes with a yq_quarter_code value; i.e. YYYYQ, taking advantage
     of some limited testing of the given argument.
 
+    YearQtr is a value type: it stores a single quarter ordinal
+    (year * 4 + qtr - 1), compares and hashes like its yq_quarter_code value,
+    and is interned, so YearQtr(20141) is YearQtr(20141) while the
+    interned cache holds fewer than _interned_size codes.
+
     self.yq_quarter_code = YYYYQ
     self.year is the YYYY part of the given yq_quarter_code value
     self.qtr is the Q part of the given yq_quarter_code value
@@ -156,20 +280,97 @@ class YearQtr(object):
       starting from self.yq_quarter_code
     '''
 
-    def __init__(self, quarter_code):
+    __slots__ = ('ordinal', )
+
+    _interned = {}
+    _interned_size = 4096
+
+    def __new__(cls, quarter_code):
+        if isinstance(quarter_code, YearQtr):
+            return quarter_code
+
         quarter_code = isinstance(quarter_code, long) and int(quarter_code) or quarter_code
         assert isinstance(quarter_code, int), \
             "YearQtr number must be an integer"
-        assert quarter_code > 0, "YearQtr number must be greater than 0"
 
-        self.yq = quarter_code
-        self.year = self.yq // 10
-        self.qtr = self.yq % 10
+        try:
+            return cls._interned[quarter_code]
+        except KeyError:
+            pass
 
-        if self.year < 2000:
+        assert quarter_code > 0, "YearQtr number must be greater than 0"
+
+        ordinal = yq_ordinal(quarter_code)
+        if ordinal // 4 < 2000:
             warnings.warn("Using a year earlier than 2000")
 
-        self.yq = self.incr(0)
+        if len(cls._interned) >= cls._interned_size:
+            cls._interned.clear()
+
+        yq = cls._interned.get(ordinal_yq(ordinal))
+        if yq is None:
+            yq = object.__new__(cls)
+            yq.ordinal = ordinal
+            cls._interned[yq.yq] = yq
+
+        cls._interned[quarter_code] = yq
+        return yq
+
+    @property
+    def yq(self):
+        return ordinal_yq(self.ordinal)
+
+    @property
+    def year(self):
+        return self.ordinal // 4
+
+    @property
+    def qtr(self):
+        return self.ordinal % 4 + 1
+
+    def __reduce__(self):
+        return YearQtr, (self.yq, )
+
+    def __repr__(self):
+        return 'YearQtr(%d)' % self.yq
+
+    def __hash__(self):  # equal to hash(self.yq), since YearQtr(20141) == 20141
+        ordinal = self.ordinal
+        return (ordinal // 4) * 10 + ordinal % 4 + 1
+
+    def _other_ordinal(self, other):
+        if isinstance(other, YearQtr):
+            return other.ordinal
+        if isinstance(other, (int, long)):
+            return yq_ordinal(other)
+        return None
+
+    def __eq__(self, other):
+        # an int is equal only to its exact yq_quarter_code, e.g. not 20145 to 20151, as the hashes must agree
+        if isinstance(other, (int, long)):
+            return other == self.yq
+        ordinal = self._other_ordinal(other)
+        return NotImplemented if ordinal is None else self.ordinal == ordinal
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __lt__(self, other):
+        ordinal = self._other_ordinal(other)
+        return NotImplemented if ordinal is None else self.ordinal < ordinal
+
+    def __le__(self, other):
+        ordinal = self._other_ordinal(other)
+        return NotImplemented if ordinal is None else self.ordinal <= ordinal
+
+    def __gt__(self, other):
+        ordinal = self._other_ordinal(other)
+        return NotImplemented if ordinal is None else self.ordinal > ordinal
+
+    def __ge__(self, other):
+        ordinal = self._other_ordinal(other)
+        return NotImplemented if ordinal is None else self.ordinal >= ordinal
 
     def incr(self, n, m=1):
         return incr_yq(self, n, m)
@@ -194,11 +395,11 @@ class YearQtr(object):
         return self.count_yq(self.n_quarters_ago(n), include=True)
 
     def prior_n_quarters(self, n):
-        return self.count_yq(self.n_quarters_ago(n - 1), include=False)
+        return self.count_yq(n, -1, include=False)
 
     def quarter_codes(self, n, include_n=True):
         if n == 0 or self.yq == n:
-            return include_n and iter([self.yq]) or None
+            return include_n and QuarterRange.from_ordinals(self.ordinal, 1, 1) or None
 
         if n < 1000:
             n = (n + 1 * include_n)
@@ -209,10 +410,367 @@ class YearQtr(object):
         return self.count_yq(n)
 
 
+class QuarterRange(object):
+    '''
+    QuarterRange is an xrange of yq_quarter_code values: QuarterRange(start, stop, step=1)
+    covers start up to, and exclusive of, stop in steps of step quarters.
+
+    QuarterRange holds only the first quarter ordinal, the step and the length,
+    so len(), `in`, indexing, slicing, reversed() and index() are computed
+    arithmetically rather than by walking the quarter codes.
+
+    e.g. QuarterRange(20141, 20152) => 20141, 20142, 20143, 20144, 20151
+         QuarterRange(20152, 20141, -2) => 20152, 20144, 20142
+    '''
+
+    __slots__ = ('_first', '_step', '_len')
+
+    def __init__(self, start, stop, step=1):
+        assert isinstance(step, (int, long)) and step != 0, "QuarterRange step must be a non-zero int"
+
+        first, stop = yq_ordinal(YearQtr(start)), yq_ordinal(YearQtr(stop))
+        self._first, self._step = first, step
+        self._len = max(0, (stop - first + step - snp.one_zero_minus_one(step)) // step)
+
+    @classmethod
+    def from_ordinals(cls, first, step, length):
+        qr = cls.__new__(cls)
+        qr._first, qr._step, qr._len = first, step, max(0, length)
+        return qr
+
+    @property
+    def start(self):
+        return ordinal_yq(self._first)
+
+    @property
+    def stop(self):
+        return ordinal_yq(self._first + self._len * self._step)
+
+    @property
+    def step(self):
+        return self._step
+
+    def __len__(self):
+        return self._len
+
+    def __nonzero__(self):
+        return self._len > 0
+
+    def __iter__(self):
+        return itertools.imap(ordinal_yq, xrange(self._first, self._first + self._len * self._step, self._step))
+
+    def __reversed__(self):
+        return iter(self[::-1])
+
+    def _position(self, yq):
+        # the index of yq in the range, or None
+        if not isinstance(yq, (int, long, YearQtr)) or isinstance(yq, bool):
+            return None
+
+        offset = yq_ordinal(yq) - self._first
+        index, remainder = divmod(offset, self._step)
+        return index if not remainder and 0 <= index < self._len else None
+
+    def __contains__(self, yq):
+        return self._position(yq) is not None
+
+    def index(self, yq):
+        index = self._position(yq)
+        if index is None:
+            raise ValueError('%r is not in QuarterRange' % (yq, ))
+        return index
+
+    def count(self, yq):
+        return int(self._position(yq) is not None)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            return self.from_ordinals(self._first + start * self._step, self._step * step,
+                                      len(xrange(start, stop, step)))
+
+        index = index + self._len if index < 0 else index
+        if not 0 <= index < self._len:
+            raise IndexError('QuarterRange index out of range')
+        return ordinal_yq(self._first + index * self._step)
+
+    def _key(self):
+        # equal ranges cover the same quarter codes, as in python 3 ranges
+        if self._len < 2:
+            return self._len, self._len and self._first, None
+        return self._len, self._first, self._step
+
+    def __eq__(self, other):
+        if not isinstance(other, QuarterRange):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        if not isinstance(other, QuarterRange):
+            return NotImplemented
+        return self._key() != other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return 'QuarterRange(%d, %d, %d)' % (self.start, self.stop, self._step)
+
+
+class YearQtrArray(object):
+    '''
+    YearQtrArray holds many yq_quarter_code values as a single numpy column of
+    quarter ordinals; i.e. quarters since year 0, where ordinal = year * 4 + qtr - 1.
+    Arithmetic on ordinals is plain integer arithmetic, so incr, dif and count
+    run as array operations instead of one YearQtr object per value.
+
+    YearQtrArray initializes with an iterable (or numpy array) of YYYYQ values,
+    a single YYYYQ value, or a YearQtr object, and applies the same normalization
+    as YearQtr; e.g. 20147 => 20153
+
+    self.ordinals is the underlying int32 array of quarter ordinals
+    self.yq, self.year, self.qtr are int32 arrays of the YYYYQ, YYYY and Q parts
+
+    incr(n) returns a new YearQtrArray incremented by n (a scalar or an array)
+    dif(yq) returns the difference in quarters between self and yq, where yq may be
+      a yq_quarter_code, a YearQtr, or a YearQtrArray of the same length
+    count(n) returns a 2-d array of yq_quarter_code values, one row per element,
+      with each row matching list(count_yq(element, n))
+    '''
+
+    dtype = np.int32
+
+    def __init__(self, quarter_codes):
+        if isinstance(quarter_codes, YearQtrArray):
+            quarter_codes = quarter_codes.yq
+
+        quarter_codes = np.atleast_1d(yq_value(quarter_codes))
+        assert quarter_codes.ndim == 1, "YearQtrArray requires a 1-d sequence of quarter codes"
+        assert quarter_codes.dtype.kind in 'iu' or not len(quarter_codes), \
+            "YearQtrArray numbers must be integers"
+        assert (quarter_codes > 0).all(), "YearQtrArray numbers must be greater than 0"
+
+        quarter_codes = quarter_codes.astype(self.dtype)
+        self.ordinals = yq_ordinal(quarter_codes)
+
+        if len(self.ordinals) and self.ordinals.min() < 2000 * 4:
+            warnings.warn("Using a year earlier than 2000")
+
+    @classmethod
+    def from_ordinals(cls, ordinals):
+        yqa = cls.__new__(cls)
+        yqa.ordinals = np.asarray(ordinals, dtype=cls.dtype)
+        return yqa
+
+    @property
+    def yq(self):
+        return ordinal_yq(self.ordinals)
+
+    @property
+    def year(self):
+        return self.ordinals // 4
+
+    @property
+    def qtr(self):
+        return self.ordinals % 4 + 1
+
+    def tolist(self):
+        return self.yq.tolist()
+
+    def incr(self, n, m=1):
+        assert m in {1, -1}, "Give a -1 second argument for subtraction"
+        return self.from_ordinals(self.ordinals + np.asarray(n, dtype=self.dtype) * m)
+
+    def dif(self, yq):
+        return self.ordinals - self._ordinals_of(yq)
+
+    def count(self, n):
+        assert isinstance(n, int) and 0 < abs(n) < 1000, "count requires a number of quarters"
+
+        steps = np.arange(n, dtype=self.dtype) if n > 0 else np.arange(n + 1, 1, dtype=self.dtype)
+        return self.from_ordinals(self.ordinals[:, np.newaxis] + steps).yq
+
+    def _ordinals_of(self, yq):
+        if isinstance(yq, YearQtrArray):
+            return yq.ordinals
+
+        return yq_ordinal(yq)
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, long, np.integer)):
+            return int(self.yq[index])
+        return self.from_ordinals(self.ordinals[index])
+
+    def __repr__(self):
+        return 'YearQtrArray(%r)' % self.tolist()
+
+    def __eq__(self, other):
+        return self.ordinals == self._ordinals_of(other)
+
+    def __ne__(self, other):
+        return self.ordinals != self._ordinals_of(other)
+
+    def __lt__(self, other):
+        return self.ordinals < self._ordinals_of(other)
+
+    def __le__(self, other):
+        return self.ordinals <= self._ordinals_of(other)
+
+    def __gt__(self, other):
+        return self.ordinals > self._ordinals_of(other)
+
+    def __ge__(self, other):
+        return self.ordinals >= self._ordinals_of(other)
+
+    __hash__ = None
+
+
+class QuarterSeries(object):
+    '''
+    QuarterSeries is a dense, quarter-indexed series: values[i] belongs to the
+    quarter base.incr(i), so a quarter's value is found by ordinal arithmetic
+    rather than a {yq: value} dict lookup.
+
+    series[yq] returns the value for a yq_quarter_code or YearQtr
+    series[start:stop] and series.window(first, last) return QuarterSeries
+      views onto the same numpy values; i.e. slicing does not copy
+    series.time_frame(obj, time_frame) returns the window for a TimeFrameMixin
+      time_frame, e.g. 'four_quarter_lookback' or 'five_year_lookback'
+    rolling_sum(n) and rolling_mean(n) return the trailing n quarter
+      sums and means, starting with the nth quarter of the series
+    '''
+
+    def __init__(self, base, values):
+        self.base = YearQtr(base)
+        self.values = np.asarray(values)
+        assert self.values.ndim == 1, "QuarterSeries values must be 1-d"
+
+    @classmethod
+    def from_dict(cls, dct, fill=np.nan):
+        # a dense series from a {yq: value} dict, from its first to its last quarter
+        assert dct, "Cannot build a QuarterSeries from an empty dict"
+
+        ordinals = np.array([yq_ordinal(yq) for yq in dct], dtype=np.int64)
+        values = np.full(ordinals.max() - ordinals.min() + 1, fill,
+                         dtype=np.result_type(np.asarray(dct.values()), np.asarray(fill)))
+        values[ordinals - ordinals.min()] = dct.values()
+
+        return cls(ordinal_yq(int(ordinals.min())), values)
+
+    @property
+    def quarter_codes(self):
+        return QuarterRange.from_ordinals(self.base.ordinal, 1, len(self.values))
+
+    @property
+    def start_code(self):
+        return self.base.yq
+
+    @property
+    def end_code(self):
+        return self.base.incr(len(self.values) - 1)
+
+    def to_dict(self):
+        return dict(itertools.izip(self.quarter_codes, self.values.tolist()))
+
+    def _index(self, yq):
+        return yq_ordinal(yq) - self.base.ordinal
+
+    def _view(self, first, stop):
+        # a QuarterSeries sharing values[first:stop], with first and stop clipped to the series
+        first, stop = max(first, 0), max(min(stop, len(self.values)), 0)
+        return QuarterSeries(ordinal_yq(self.base.ordinal + first), self.values[first:max(first, stop)])
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __contains__(self, yq):
+        return 0 <= self._index(yq) < len(self.values)
+
+    def __getitem__(self, yq):
+        if isinstance(yq, slice):
+            assert yq.step is None, "QuarterSeries slices do not take a step"
+            first = 0 if yq.start is None else self._index(yq.start)
+            stop = len(self.values) if yq.stop is None else self._index(yq.stop)
+            return self._view(first, stop)
+
+        index = self._index(yq)
+        if not 0 <= index < len(self.values):
+            raise KeyError(yq)
+        return self.values[index]
+
+    def get(self, yq, default=None):
+        try:
+            return self[yq]
+        except KeyError:
+            return default
+
+    def window(self, first, last):
+        # the view from first to last inclusive
+        return self._view(self._index(first), self._index(last) + 1)
+
+    def time_frame(self, time_frame_object, time_frame='four_quarter_lookback'):
+        return self.window(*time_frame_object.get_first_last(time_frame))
+
+    def rolling_sum(self, n):
+        assert n > 0, "rolling_sum requires a positive number of quarters"
+
+        values = self.values.astype(np.result_type(self.values, np.float64))
+        if n > len(values):
+            return QuarterSeries(self.base.incr(n - 1), values[:0])
+
+        # each window is summed on its own, so a nan only affects the windows which contain it
+        return QuarterSeries(self.base.incr(n - 1), np.convolve(values, np.ones(n), 'valid'))
+
+    def rolling_mean(self, n):
+        rolling = self.rolling_sum(n)
+        rolling.values /= n
+        return rolling
+
+    def __repr__(self):
+        return 'QuarterSeries(%d, %r)' % (self.base.yq, self.values)
+
+
+class TimeFrameDict(dict):
+    '''
+    TimeFrameDict is the dict returned by TimeFrameMixin.time_frame_dict.
+    The named time frames are stored as entries, while each yq_quarter_code
+    in the time frame is looked up lazily as (yq_quarter_code, )
+    rather than stored as its own entry.
+    '''
+
+    def __init__(self, quarter_codes, *args, **kwargs):
+        super(TimeFrameDict, self).__init__(*args, **kwargs)
+        self.quarter_codes = quarter_codes
+
+    def __missing__(self, key):
+        if key in self.quarter_codes:
+            return yq_value(key),
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return super(TimeFrameDict, self).__contains__(key) or key in self.quarter_codes
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
 class TimeFrameMixin(object):
     _start_code = None
     _end_code = None
     _current_quarter_code = None
+    _time_frame_dict = None  # (time frame key, TimeFrameDict)
 
     def set_current_quarter_code(self, quarter_code):
         assert quarter_code >= self._start_code and quarter_code <= self.end_code, \
@@ -301,19 +859,25 @@ class TimeFrameMixin(object):
         return dif_yq(self.end_code, self.start_code) + 1
 
     @property
-    def time_frame_quarter_codes(self):  # a generator for all time frame quarter codes
+    def time_frame_quarter_codes(self):  # a QuarterRange of all time frame quarter codes
         return YearQtr(self.start_code).quarter_codes(self.end_code)
 
     @property
     def time_frame_dict(self):
-        # a dict of time frame codes in Iterable form
-        dct = {
+        # a dict of time frame codes in Iterable form, rebuilt only when the time frame changes
+        key = self.start_code, self.end_code, self.current_quarter_code
+        if self._time_frame_dict is None or self._time_frame_dict[0] != key:
+            self._time_frame_dict = key, self._build_time_frame_dict()
+        return self._time_frame_dict[1]
+
+    def _build_time_frame_dict(self):
+        dct = TimeFrameDict(self.time_frame_quarter_codes, {
             'first': (self.start_code, ),
             'last': (self.end_code, ),
             'current': (self.current_quarter_code, ),
             'ends': (self.start_code, self.end_code),
             'all': self.time_frame_quarter_codes
-        }
+        })
 
         four_qlb = self.yq_current.incr(-3)
         four_qlb_start = four_qlb if four_qlb > self.end_code else self.start_code
@@ -322,16 +886,61 @@ class TimeFrameMixin(object):
         five_ylb = self.yq_current.incr(-19)
 
         dct['four_quarter_lookback'] = (four_qlb, self.end_code) if four_qlb >= self.start_code else None
-        dct['past_four_quarters'] = list(self.yq_current.quarter_codes(four_qlb_start))
+        dct['past_four_quarters'] = self.yq_current.quarter_codes(four_qlb_start)
         dct['one_year_lookback'] = (annual_lb, self.end_code) if annual_lb >= self.start_code else None
         dct['three_year_lookback'] = (three_ylb, self.end_code) if three_ylb >= self.start_code else None
         dct['five_year_lookback'] = (five_ylb, self.end_code) if five_ylb >= self.start_code else None
 
-        for quarter_code in self.time_frame_quarter_codes:
-            dct[quarter_code] = (quarter_code, )
-
         return dct
 
+    @classmethod
+    def time_frame_columns(cls, frames, inclusive=True):
+        '''
+        time_frame_columns evaluates many time frames at once, where frames is an
+        iterable of (start_code, n, current_quarter) tuples given as they would be
+        to set_time_frame; n and current_quarter may be None or omitted.
+
+        It returns a dict of {time_frame_dict key: (first, last)}, where first and
+        last are numpy arrays of yq_quarter_code values, one per frame, equal to
+        look_back_or_last(key) for an object given that frame.
+        '''
+
+        frames = [tuple(frame) + (None, ) * (3 - len(frame)) for frame in frames]
+        start_codes, ns, current_quarters = (np.array([v or 0 for v in column], dtype=np.int64)
+                                              for column in zip(*frames) or ((), (), ()))
+
+        assert (start_codes > 999).all(), "Requires start_code"
+        assert inclusive or (ns != 0).all(), \
+            "Cannot exclude the only quarter from a 1 quarter analysis. Set inclusive=True"
+
+        start = yq_ordinal(start_codes)
+        other = yq_ordinal(np.where(ns > 999, ns, start_codes))  # the ordinal of n when n is a yq_quarter_code
+        counts = [ns > 999, ns < 0, ns > 0]
+
+        first = np.select(counts, [np.minimum(start, other), start + ns + inclusive, start], start)
+        last = np.select(counts, [np.maximum(start, other), start, start + ns - inclusive], start)
+
+        current = np.where(current_quarters > 0, yq_ordinal(current_quarters), last)
+        assert ((current >= first) & (current <= last)).all(), "Current Quarter must be within time frame"
+
+        four_qlb = current - 3
+        past_four_start = np.where(four_qlb > last, four_qlb, first)
+
+        columns = {
+            'first': (first, first),
+            'last': (last, last),
+            'current': (current, current),
+            'ends': (first, last),
+            'all': (first, last),
+            'four_quarter_lookback': (np.maximum(four_qlb, first), last),
+            'past_four_quarters': (np.minimum(current, past_four_start), np.maximum(current, past_four_start)),
+            'one_year_lookback': (np.maximum(current - 3, first), last),
+            'three_year_lookback': (np.maximum(current - 11, first), last),
+            'five_year_lookback': (np.maximum(current - 19, first), last),
+        }
+
+        return dict((key, (ordinal_yq(lb_first), ordinal_yq(lb_last))) for key, (lb_first, lb_last) in columns.items())
+
     def look_back_or_last(self, time_frame='four_quarter_lookback'):
         if isinstance(time_frame, int):
             start, stop = max(time_frame, self.start_code), self.end_code
@@ -339,7 +948,7 @@ class TimeFrameMixin(object):
             try:
                 quarter_codes = self.time_frame_dict[time_frame]
                 start, stop = (self.start_code, self.end_code) if quarter_codes is None \
-                                  else quarter_codes[0], quarter_codes[-1]
+                    else (quarter_codes[0], quarter_codes[-1])
             except KeyError:
                 assert False, "Invalid key for time_frame_dict"
 